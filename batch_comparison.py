@@ -0,0 +1,283 @@
+"""
+Headless batch comparison of many GM Transport and PASE file pairs.
+
+    python batch_comparison.py src/ --output-dir db/batch --workers 4
+    python batch_comparison.py manifest.csv --format Excel
+    python batch_comparison.py src/ --profile
+    python batch_comparison.py src/ --backend polars
+
+The input is a directory or a manifest CSV with gmt and pase columns and an
+optional name column. Every pair is loaded, cleaned and compared in a process
+pool, results and a summary report are written to the output directory. With
+--profile every pair also writes a flamegraph .folded file and a memory report
+next to its result.
+"""
+
+# build-in libs
+import argparse
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# installed libs
+import pandas as pd
+
+# custom libs
+from data_cleaning.gmt_viajes_salida import clean_gmt_data, load_gmt_data
+from data_cleaning.pase import load_pase_data
+from export_writers import EXPORT_FORMATS, export_result
+from gmt_pase_comparison import (
+    COMPARISON_BACKEND,
+    COMPARISON_BACKENDS,
+    FECHA_INICIO_COMPARACION,
+    comparison,
+)
+from profiling import profile_run, write_profile
+
+BATCH_OUTPUT_DIR = os.path.join("db", "batch")
+GMT_EXTENSIONS = (".xlsx", ".xls")
+PASE_EXTENSIONS = (".csv",)
+
+
+def pair_key(path: str) -> str:
+    # Trailing period of a file name, e.g. "2025_012" of cruces_PASE_2025_012.csv
+    stem = os.path.splitext(os.path.basename(path))[0]
+    match = re.search(r"(\d+(?:[_-]\d+)*)$", stem)
+    return match.group(1) if match else stem
+
+
+def pairs_from_directory(directory: str) -> pd.DataFrame:
+    """
+    Match GM Transport Excel files with PASE CSV files by their trailing period.
+
+    A directory with only one file of each type is always one pair.
+    """
+    files = sorted(os.path.join(directory, f) for f in os.listdir(directory))
+    gmt_files = [f for f in files if f.lower().endswith(GMT_EXTENSIONS)]
+    pase_files = [f for f in files if f.lower().endswith(PASE_EXTENSIONS)]
+
+    if len(gmt_files) == 1 and len(pase_files) == 1:
+        return pd.DataFrame(
+            {
+                "name": [pair_key(gmt_files[0])],
+                "gmt": gmt_files,
+                "pase": pase_files,
+            }
+        )
+
+    gmt_by_key = {pair_key(f): f for f in gmt_files}
+    pase_by_key = {pair_key(f): f for f in pase_files}
+    for key in sorted(set(gmt_by_key) ^ set(pase_by_key)):
+        logging.warning(
+            f"No matching file pair for {gmt_by_key.get(key) or pase_by_key.get(key)}"
+        )
+    keys = [key for key in gmt_by_key if key in pase_by_key]
+    return pd.DataFrame(
+        {
+            "name": keys,
+            "gmt": [gmt_by_key[key] for key in keys],
+            "pase": [pase_by_key[key] for key in keys],
+        }
+    )
+
+
+def pairs_from_manifest(manifest_path: str) -> pd.DataFrame:
+    """
+    Read file pairs from a manifest CSV, relative paths start at the manifest.
+    """
+    pairs_df = pd.read_csv(manifest_path, dtype=str)
+    missing_columns = {"gmt", "pase"} - set(pairs_df.columns)
+    if missing_columns:
+        raise ValueError(f"Manifest {manifest_path} needs columns {missing_columns}")
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    for column in ["gmt", "pase"]:
+        pairs_df[column] = [os.path.join(base_dir, p) for p in pairs_df[column]]
+    if "name" not in pairs_df.columns:
+        pairs_df["name"] = pairs_df["gmt"].map(pair_key)
+    return pairs_df[["name", "gmt", "pase"]]
+
+
+def compare_raw_data(
+    viajes_df: pd.DataFrame, pase_file, workers: int = 1, backend: str = None
+) -> pd.DataFrame:
+    """
+    Clean and compare a GM Transport export, as load_gmt_data returns it, with a
+    PASE file.
+
+    Only PASE dates from FECHA_INICIO_COMPARACION to the last GM Transport
+    departure are read, as in the app. The polars backend cleans and compares
+    both in one lazy query, see polars_file_comparison.
+    """
+    if (backend or COMPARISON_BACKEND) == "polars":
+        # polars_comparison imports polars, only needed for this backend
+        from polars_comparison import polars_file_comparison
+
+        return polars_file_comparison(viajes_df, pase_file)
+    viajes_df = clean_gmt_data(viajes_df)
+    pase_df = load_pase_data(
+        pase_file, FECHA_INICIO_COMPARACION, viajes_df["Fecha Salida"].max()
+    )
+    return comparison(viajes_df, pase_df, workers=workers, backend=backend)
+
+
+def compare_files(
+    gmt_file, pase_file, workers: int = 1, backend: str = None
+) -> pd.DataFrame:
+    """
+    Load, clean and compare one GM Transport and PASE file pair, see
+    compare_raw_data.
+    """
+    return compare_raw_data(load_gmt_data(gmt_file), pase_file, workers, backend)
+
+
+def process_pair(
+    name: str,
+    gmt_file: str,
+    pase_file: str,
+    output_dir: str,
+    export_format: str,
+    profile: bool = False,
+    trace_memory: bool = True,
+    backend: str = COMPARISON_BACKEND,
+) -> dict:
+    """
+    Compare one file pair and write its result, errors are reported and not raised
+    so one bad pair does not stop the batch.
+
+    With profile the load, clean and compare of the pair are profiled, see
+    profiling.profile_run.
+    """
+    start = time.perf_counter()
+    report = {"name": name, "gmt": gmt_file, "pase": pase_file, "profile": None}
+    try:
+        output_prefix = os.path.join(output_dir, f"gmt_pase_{name}")
+        if profile:
+            with profile_run(trace_memory=trace_memory) as pair_profile:
+                result_df = compare_files(gmt_file, pase_file, backend=backend)
+            report["profile"] = write_profile(pair_profile, output_prefix)[0]
+        else:
+            result_df = compare_files(gmt_file, pase_file, backend=backend)
+        file_extension = EXPORT_FORMATS[export_format][0]
+        output_path = f"{output_prefix}.{file_extension}"
+        export_result(result_df, export_format, output_path)
+
+        report["status"] = "ok"
+        report["rows"] = len(result_df)
+        report["units"] = result_df["No.Economico"].nunique()
+        report["without_viaje"] = int(result_df["Viaje"].isna().sum())
+        report["output"] = output_path
+        report["error"] = None
+    except Exception as e:
+        logging.error(f"Error comparing {name}: {str(e)}")
+        report["status"] = "error"
+        report["error"] = str(e)
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    return report
+
+
+def batch_comparison(
+    pairs_df: pd.DataFrame,
+    output_dir: str = BATCH_OUTPUT_DIR,
+    workers: int = 1,
+    export_format: str = "CSV",
+    profile: bool = False,
+    trace_memory: bool = True,
+    backend: str = COMPARISON_BACKEND,
+) -> pd.DataFrame:
+    """
+    Compare every file pair, one pair per worker process, and write the summary
+    report to output_dir/summary.csv.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    arguments = (
+        pairs_df["name"],
+        pairs_df["gmt"],
+        pairs_df["pase"],
+        [output_dir] * len(pairs_df),
+        [export_format] * len(pairs_df),
+        [profile] * len(pairs_df),
+        [trace_memory] * len(pairs_df),
+        [backend] * len(pairs_df),
+    )
+    logging.info(f"Comparing {len(pairs_df)} file pairs with {workers} workers")
+    if workers > 1 and len(pairs_df) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            reports = list(executor.map(process_pair, *arguments))
+    else:
+        reports = list(map(process_pair, *arguments))
+
+    summary_df = pd.DataFrame(
+        reports,
+        columns=[
+            "name",
+            "gmt",
+            "pase",
+            "status",
+            "rows",
+            "units",
+            "without_viaje",
+            "seconds",
+            "output",
+            "profile",
+            "error",
+        ],
+    )
+    summary_df = summary_df.astype(
+        {"rows": "Int64", "units": "Int64", "without_viaje": "Int64"}
+    )
+    summary_path = os.path.join(output_dir, "summary.csv")
+    summary_df.to_csv(summary_path, index=False, encoding="utf-8")
+    logging.info(
+        f"Batch finished : {(summary_df['status'] == 'ok').sum()} ok, {(summary_df['status'] == 'error').sum()} errors, summary in {summary_path}"
+    )
+    return summary_df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare many GM Transport and PASE file pairs"
+    )
+    parser.add_argument("source", help="Directory of file pairs or a manifest CSV")
+    parser.add_argument("--output-dir", default=BATCH_OUTPUT_DIR)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="CSV")
+    parser.add_argument(
+        "--backend", choices=COMPARISON_BACKENDS, default=COMPARISON_BACKEND
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="Profile every pair, see profiling.py"
+    )
+    parser.add_argument(
+        "--no-trace-memory",
+        action="store_true",
+        help="Profile without tracemalloc, which slows the run",
+    )
+    args = parser.parse_args(argv)
+
+    if os.path.isdir(args.source):
+        pairs_df = pairs_from_directory(args.source)
+    else:
+        pairs_df = pairs_from_manifest(args.source)
+
+    summary_df = batch_comparison(
+        pairs_df,
+        args.output_dir,
+        args.workers,
+        args.format,
+        args.profile,
+        not args.no_trace_memory,
+        args.backend,
+    )
+    print(summary_df.drop(columns=["gmt", "pase", "profile"]).to_string(index=False))
+    return 0 if (summary_df["status"] == "ok").all() else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    raise SystemExit(main())
@@ -0,0 +1,235 @@
+"""
+Scaling benchmark of the GMT and PASE reconciliation on synthetic data.
+
+Run from the repository root:
+
+    python -m benchmarks.run_benchmarks --sizes 10000 100000 1000000 10000000
+    python -m benchmarks.run_benchmarks --backend polars --label polars
+
+Every size is timed for the full pipeline and for each instrumented stage. The
+results are written to benchmarks/results/<label>.json, pass a previous results
+file with --compare to print the speedup between versions.
+"""
+
+# build-in libs
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+# installed libs
+import pandas as pd
+
+# custom libs
+from benchmarks.synthetic_data import generate_gmt_pase
+from data_cleaning.gmt_viajes_salida import clean_gmt_data
+from data_cleaning.pase import clean_pase_data, load_pase_data
+from gmt_pase_comparison import COMPARISON_BACKEND, COMPARISON_BACKENDS, comparison
+from instrumentation import (
+    disable_instrumentation,
+    enable_instrumentation,
+    instrumentation_events,
+    instrumentation_summary,
+    peak_memory_mb,
+)
+
+BENCHMARK_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+RESULTS_DIR = os.path.join("benchmarks", "results")
+
+
+def current_version() -> str:
+    # Short git commit of the working tree, used as default label
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return datetime.now().strftime("%Y%m%d%H%M%S")
+
+
+def benchmark_size(
+    n_crossings: int,
+    seed: int = 0,
+    workers: int = 1,
+    with_files: bool = False,
+    backend: str = COMPARISON_BACKEND,
+) -> dict:
+    """
+    Time the pipeline on one synthetic dataset of n_crossings PASE rows.
+
+    With with_files the PASE CSV is written to a temporary file and parsed by
+    load_pase_data, otherwise the raw dataframe is cleaned directly. The GM
+    Transport Excel is never written, the export of 10M crossings does not fit
+    in one sheet.
+    """
+    gmt_df, pase_df = generate_gmt_pase(n_crossings=n_crossings, seed=seed)
+    logging.info(
+        f"Benchmark {n_crossings} crossings : GMT rows {len(gmt_df)} PASE rows {len(pase_df)}"
+    )
+
+    enable_instrumentation()
+    start = time.perf_counter()
+    viajes_df = clean_gmt_data(gmt_df)
+    if with_files:
+        with tempfile.TemporaryDirectory() as directory:
+            pase_path = os.path.join(directory, "pase_data.csv")
+            pase_df.to_csv(pase_path, index=False, encoding="utf-8")
+            pase_df = load_pase_data(pase_path)
+    else:
+        pase_df = clean_pase_data(pase_df)
+    result_df = comparison(viajes_df, pase_df, workers=workers, backend=backend)
+    total_seconds = time.perf_counter() - start
+    summary = instrumentation_summary(instrumentation_events())
+    disable_instrumentation()
+
+    return {
+        "crossings": n_crossings,
+        "gmt_rows": len(gmt_df),
+        "pase_rows": len(pase_df),
+        "result_rows": len(result_df),
+        "units": int(pase_df["No.Economico"].nunique()),
+        "workers": workers,
+        "backend": backend,
+        "total_seconds": round(total_seconds, 6),
+        "peak_memory_mb": peak_memory_mb(),
+        "stages": summary["stages"],
+    }
+
+
+def run_benchmarks(
+    sizes: list = None,
+    seed: int = 0,
+    workers: int = 1,
+    with_files: bool = False,
+    label: str = None,
+    results_dir: str = RESULTS_DIR,
+    backend: str = COMPARISON_BACKEND,
+) -> str:
+    """
+    Benchmark every size and save the results, returns the results path.
+
+    Sizes run in ascending order because peak memory is measured for the whole
+    process.
+    """
+    if sizes is None:
+        sizes = BENCHMARK_SIZES
+    if label is None:
+        label = current_version()
+
+    results = []
+    for n_crossings in sorted(sizes):
+        result = benchmark_size(n_crossings, seed, workers, with_files, backend)
+        logging.info(
+            f"{n_crossings} crossings : {result['total_seconds']:.2f} s, peak memory {result['peak_memory_mb']} MB"
+        )
+        results.append(result)
+
+    report = {
+        "label": label,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "seed": seed,
+        "with_files": with_files,
+        "results": results,
+    }
+    os.makedirs(results_dir, exist_ok=True)
+    results_path = os.path.join(results_dir, f"{label}.json")
+    with open(results_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    logging.info(f"Benchmark results saved to {results_path}")
+    return results_path
+
+
+def stage_seconds(report: dict) -> pd.DataFrame:
+    # Seconds per crossings size and stage, the full pipeline as "total"
+    rows = []
+    for result in report["results"]:
+        rows.append(
+            {
+                "crossings": result["crossings"],
+                "stage": "total",
+                "seconds": result["total_seconds"],
+            }
+        )
+        for stage_record in result["stages"]:
+            rows.append(
+                {
+                    "crossings": result["crossings"],
+                    "stage": stage_record["stage"],
+                    "seconds": stage_record["seconds"],
+                }
+            )
+    return pd.DataFrame(rows, columns=["crossings", "stage", "seconds"])
+
+
+def compare_results(baseline_path: str, results_path: str) -> pd.DataFrame:
+    """
+    Seconds of two results files side by side, speedup above 1 means faster.
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(results_path, encoding="utf-8") as f:
+        current = json.load(f)
+
+    comparison_df = stage_seconds(baseline).merge(
+        stage_seconds(current),
+        on=["crossings", "stage"],
+        how="outer",
+        suffixes=(f" {baseline['label']}", f" {current['label']}"),
+    )
+    comparison_df["speedup"] = (
+        comparison_df[f"seconds {baseline['label']}"]
+        / comparison_df[f"seconds {current['label']}"]
+    ).round(2)
+    return comparison_df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Scaling benchmark of the GMT and PASE comparison"
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=BENCHMARK_SIZES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--backend", choices=COMPARISON_BACKENDS, default=COMPARISON_BACKEND
+    )
+    parser.add_argument(
+        "--with-files", action="store_true", help="Parse the PASE data from CSV"
+    )
+    parser.add_argument("--label", default=None, help="Defaults to the git commit")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--compare", default=None, help="Previous results file")
+    parser.add_argument("--verbose", action="store_true", help="Log every stage")
+    args = parser.parse_args()
+
+    # the comparison logs every No.Economico, only shown with --verbose
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    results_path = run_benchmarks(
+        args.sizes,
+        args.seed,
+        args.workers,
+        args.with_files,
+        args.label,
+        args.results_dir,
+        args.backend,
+    )
+    print(f"Benchmark results saved to {results_path}")
+    if args.compare is not None:
+        print(compare_results(args.compare, results_path).to_string(index=False))
+    else:
+        with open(results_path, encoding="utf-8") as f:
+            print(stage_seconds(json.load(f)).to_string(index=False))
@@ -0,0 +1,222 @@
+"""
+Synthetic GM Transport trip exports and PASE crossing statements.
+
+The frames use the raw column layouts read by load_gmt_data and load_pase_data,
+so they go through clean_gmt_data, clean_pase_data and comparison unchanged.
+"""
+
+# build-in libs
+import argparse
+import os
+
+# installed libs
+import numpy as np
+import pandas as pd
+
+CASETAS = ["LINCOLN", "COLOMBIA", "PUENTE III", "PUENTE II"]
+CASETAS_PROBABILITY = [0.3, 0.3, 0.25, 0.15]
+
+# every time of day as "HH:MM:SS" and as PASE writes early hours, "H:MM:SS"
+SECONDS_OF_DAY = np.arange(24 * 60 * 60)
+HORAS = np.array(
+    [f"{s // 3600:02d}:{s % 3600 // 60:02d}:{s % 60:02d}" for s in SECONDS_OF_DAY],
+    dtype=object,
+)
+HORAS_SIN_CERO = np.array(
+    [f"{s // 3600}:{s % 3600 // 60:02d}:{s % 60:02d}" for s in SECONDS_OF_DAY],
+    dtype=object,
+)
+# and as 12 hour times, "HH:MM:SS AM", which only format mixed parses
+HORAS_12 = np.array(
+    [
+        f"{(s // 3600 - 1) % 12 + 1:02d}:{s % 3600 // 60:02d}:{s % 60:02d}"
+        + (" AM" if s < 12 * 3600 else " PM")
+        for s in SECONDS_OF_DAY
+    ],
+    dtype=object,
+)
+
+
+def unit_names(n_units: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    No.Economico numbers and GM Transport Tractocamión names of the fleet.
+
+    The last unit is 3502, the only one reported without the VELOX prefix.
+    """
+    numeros = np.append(np.arange(2400, 2400 + n_units - 1), 3502)
+    nombres = np.array([f"VELOX {n}" for n in numeros[:-1]] + ["3502"], dtype=object)
+    return numeros, nombres
+
+
+def tie_with_previous(
+    segundos: np.ndarray, grupos: np.ndarray, fraction: float, rng
+) -> np.ndarray:
+    # Copy the second of the previous row of the same group to a fraction of rows
+    empate = rng.random(len(segundos)) < fraction
+    empate[1:] &= grupos[1:] == grupos[:-1]
+    empate[0] = False
+    segundos = segundos.copy()
+    segundos[empate] = segundos[np.flatnonzero(empate) - 1]
+    return segundos
+
+
+def generate_gmt_pase(
+    n_crossings: int = 10_000,
+    n_days: int = 90,
+    crossings_per_day: float = 8.0,
+    fecha_inicio: str = "2024-12-20",
+    seed: int = 0,
+    tied_fraction: float = 0.05,
+    text_viajes: bool = False,
+    twelve_hour_fraction: float = 0.02,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Generate a raw GM Transport export and a raw PASE statement.
+
+    The amount of units is derived from n_crossings, n_days and crossings_per_day.
+    Units have 0 to 3 trips per day, some trips have a second row for a unit
+    outside the Velox fleet, a part of the crossings are at LINCOLN and some dates
+    have crossings without trips. The first days are before the comparison cutoff.
+    About tied_fraction of the trips depart at the same second as the previous
+    trip of their unit and day, and as many crossings share the time of the
+    previous crossing, so tie breaks are exercised. With text_viajes the Viaje
+    numbers are written as text trip ids, e.g. "V-100227". About
+    twelve_hour_fraction of the PASE Horas are written as 12 hour times, e.g.
+    "01:05:03 PM", so the format mixed fallback of the Hora parsing is exercised.
+    """
+    rng = np.random.default_rng(seed)
+    # ties use their own generator, the other values do not depend on tied_fraction
+    rng_empates = np.random.default_rng([seed, 1])
+    rng_horas_12 = np.random.default_rng([seed, 2])
+    n_units = max(2, int(round(n_crossings / (n_days * crossings_per_day))))
+    numeros, nombres = unit_names(n_units)
+    fechas = pd.date_range(fecha_inicio, periods=n_days, freq="D")
+    fechas_str = np.array(fechas.strftime("%d/%m/%Y"), dtype=object)
+
+    # * trips by unit and day, 0 to 3 trips per day
+    viajes_por_dia = rng.choice(
+        [0, 1, 2, 3], size=n_units * n_days, p=[0.2, 0.45, 0.25, 0.1]
+    )
+    unidad_dia = np.repeat(np.arange(n_units * n_days), viajes_por_dia)
+    viaje_unidad = unidad_dia // n_days
+    viaje_dia = unidad_dia % n_days
+    viaje_segundo = rng.integers(0, 86400, size=len(unidad_dia))
+    viaje_segundo = tie_with_previous(
+        viaje_segundo, unidad_dia, tied_fraction, rng_empates
+    )
+    viaje_numero = 100_000 + np.arange(len(unidad_dia))
+
+    # a fifth of the trips has a second row, most of them for a non Velox unit
+    segunda_fila = rng.random(len(unidad_dia)) < 0.2
+    segunda_otra = rng.random(len(unidad_dia)) < 0.7
+    segunda_segundo = np.minimum(
+        viaje_segundo + rng.integers(0, 90 * 60, size=len(unidad_dia)), 86399
+    )
+    tractocamion = np.concatenate(
+        [
+            nombres[viaje_unidad],
+            np.where(
+                segunda_otra[segunda_fila],
+                "TRACTO 10" + (viaje_unidad[segunda_fila] % 10).astype(str),
+                nombres[viaje_unidad[segunda_fila]],
+            ),
+        ]
+    )
+    gmt_df = pd.DataFrame(
+        {
+            "Viaje Docto.": np.concatenate([viaje_numero, viaje_numero[segunda_fila]]),
+            "Tractocamión ": tractocamion,
+            "Fecha y Hora de Salida": np.concatenate(
+                [
+                    fechas_str[viaje_dia] + " " + HORAS[viaje_segundo],
+                    fechas_str[viaje_dia[segunda_fila]]
+                    + " "
+                    + HORAS[segunda_segundo[segunda_fila]],
+                ]
+            ),
+            "Ruta": np.char.add(
+                "RUTA ",
+                rng.integers(1, 40, size=len(unidad_dia) + segunda_fila.sum()).astype(
+                    str
+                ),
+            ).astype(object),
+        }
+    )
+
+    # trips of units outside the Velox fleet
+    n_otros = max(1, len(unidad_dia) // 10)
+    otros_df = pd.DataFrame(
+        {
+            "Viaje Docto.": viaje_numero.max() + 1 + np.arange(n_otros),
+            "Tractocamión ": "TRACTO 200",
+            "Fecha y Hora de Salida": fechas_str[rng.integers(0, n_days, n_otros)]
+            + " "
+            + HORAS[rng.integers(0, 86400, n_otros)],
+            "Ruta": "RUTA 99",
+        }
+    )
+    gmt_df = pd.concat([gmt_df, otros_df], ignore_index=True)
+    if text_viajes:
+        gmt_df["Viaje Docto."] = "V-" + gmt_df["Viaje Docto."].astype(str)
+    gmt_df = gmt_df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+    # * crossings by unit and day, also on dates without trips
+    cruces_por_dia = rng.poisson(crossings_per_day, size=n_units * n_days)
+    unidad_dia = np.repeat(np.arange(n_units * n_days), cruces_por_dia)
+    cruce_unidad = unidad_dia // n_days
+    cruce_dia = unidad_dia % n_days
+    cruce_segundo = rng.integers(0, 86400, size=len(unidad_dia))
+    cruce_segundo = tie_with_previous(
+        cruce_segundo, unidad_dia, tied_fraction, rng_empates
+    )
+    sin_cero = rng.random(len(unidad_dia)) < 0.3
+    horas = np.where(sin_cero, HORAS_SIN_CERO[cruce_segundo], HORAS[cruce_segundo])
+    doce_horas = rng_horas_12.random(len(unidad_dia)) < twelve_hour_fraction
+    horas = np.where(doce_horas, HORAS_12[cruce_segundo], horas)
+    importes = np.array(
+        [f"${p:,.2f}" for p in [215.0, 431.5, 647.0, 1078.5, 1294.0]], dtype=object
+    )
+
+    pase_df = pd.DataFrame(
+        {
+            "Tag": " IMDM" + pd.Series(numeros[cruce_unidad]).astype(str) + " ",
+            "No.Economico": numeros[cruce_unidad],
+            "Fecha": fechas_str[cruce_dia],
+            "Hora": horas,
+            "Caseta": rng.choice(CASETAS, size=len(unidad_dia), p=CASETAS_PROBABILITY),
+            "Carril": " A" + pd.Series(rng.integers(1, 6, len(unidad_dia))).astype(str),
+            "Clase": rng.integers(1, 10, size=len(unidad_dia)),
+            "Importe": importes[rng.integers(0, len(importes), len(unidad_dia))],
+            "Fecha Aplicacion": fechas_str[np.minimum(cruce_dia + 1, n_days - 1)],
+            "Hora Aplicacion": HORAS[rng.integers(0, 86400, size=len(unidad_dia))],
+            "Consecar": 1 + np.arange(len(unidad_dia)),
+        }
+    )
+    return gmt_df, pase_df
+
+
+def write_synthetic_files(
+    directory: str, n_crossings: int = 10_000, seed: int = 0
+) -> tuple[str, str]:
+    """
+    Write the files used by LOCAL_EXECUTION in velox-app.py to directory.
+    """
+    gmt_df, pase_df = generate_gmt_pase(n_crossings=n_crossings, seed=seed)
+    os.makedirs(directory, exist_ok=True)
+    gmt_path = os.path.join(directory, "gmt_transport_1.xlsx")
+    pase_path = os.path.join(directory, "pase_data_1.csv")
+    gmt_df.to_excel(gmt_path, index=False)
+    pase_df.to_csv(pase_path, index=False, encoding="utf-8")
+    return gmt_path, pase_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write synthetic GM Transport and PASE files"
+    )
+    parser.add_argument("directory", nargs="?", default=os.path.join("test", "src"))
+    parser.add_argument("--crossings", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for path in write_synthetic_files(args.directory, args.crossings, args.seed):
+        print(f"Written {path}")
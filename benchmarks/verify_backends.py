@@ -0,0 +1,116 @@
+"""
+Differential check of the pandas and the Polars comparison backends.
+
+Run from the repository root:
+
+    python -m benchmarks.verify_backends --sizes 10000 100000 --seeds 0 1 2
+    python -m benchmarks.verify_backends --gmt gmt.xlsx --pase pase.csv
+
+Every synthetic dataset, or the given file pair, is cleaned once and compared
+with both backends, then cleaned and compared by each backend from the raw
+GM Transport rows and the PASE CSV file. The results must be identical, the
+exit code is 1 when a dataset differs.
+"""
+
+# build-in libs
+import argparse
+import logging
+import os
+import tempfile
+
+# installed libs
+import pandas as pd
+
+# custom libs
+from batch_comparison import compare_raw_data
+from benchmarks.synthetic_data import generate_gmt_pase
+from data_cleaning.gmt_viajes_salida import clean_gmt_data, load_gmt_data
+from data_cleaning.pase import clean_pase_data, load_pase_data
+from gmt_pase_comparison import FECHA_INICIO_COMPARACION
+from polars_comparison import compare_backends
+
+
+def raw_report(gmt_df: pd.DataFrame, pase_file: str) -> dict:
+    # compare_backends from the raw data, the cleaning of both backends included
+    report = compare_backends(gmt_df, pase_file, compare=compare_raw_data)
+    return {
+        "raw_pandas_seconds": report["pandas_seconds"],
+        "raw_polars_seconds": report["polars_seconds"],
+        "raw_identical": report["identical"],
+        "raw_difference": report["difference"],
+    }
+
+
+def verify_synthetic(sizes: list, seeds: list) -> pd.DataFrame:
+    """
+    Compare both backends on one synthetic dataset per size and seed, with numeric
+    and with text Viajes.
+    """
+    reports = []
+    with tempfile.TemporaryDirectory() as directory:
+        pase_file = os.path.join(directory, "pase.csv")
+        for n_crossings in sizes:
+            for seed in seeds:
+                for text_viajes in [False, True]:
+                    gmt_df, pase_df = generate_gmt_pase(
+                        n_crossings=n_crossings, seed=seed, text_viajes=text_viajes
+                    )
+                    report = compare_backends(
+                        clean_gmt_data(gmt_df), clean_pase_data(pase_df)
+                    )
+                    pase_df.to_csv(pase_file, index=False, encoding="utf-8")
+                    report.update(raw_report(gmt_df, pase_file))
+                    reports.append(
+                        {
+                            "crossings": n_crossings,
+                            "seed": seed,
+                            "viajes": "text" if text_viajes else "number",
+                            **report,
+                        }
+                    )
+    return pd.DataFrame(reports)
+
+
+def verify_files(gmt_file: str, pase_file: str) -> pd.DataFrame:
+    """
+    Compare both backends on one GM Transport and PASE file pair.
+    """
+    gmt_df = load_gmt_data(gmt_file)
+    viajes_df = clean_gmt_data(gmt_df)
+    pase_df = load_pase_data(
+        pase_file, FECHA_INICIO_COMPARACION, viajes_df["Fecha Salida"].max()
+    )
+    report = compare_backends(viajes_df, pase_df)
+    report.update(raw_report(gmt_df, pase_file))
+    return pd.DataFrame([{"gmt": gmt_file, **report}])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check the pandas and Polars comparison backends give the same result"
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0, 1, 2])
+    parser.add_argument("--gmt", default=None, help="GM Transport file to check")
+    parser.add_argument("--pase", default=None, help="PASE file to check")
+    args = parser.parse_args(argv)
+
+    if args.gmt and args.pase:
+        reports_df = verify_files(args.gmt, args.pase)
+    else:
+        reports_df = verify_synthetic(args.sizes, args.seeds)
+
+    differences = ["difference", "raw_difference"]
+    print(reports_df.drop(columns=differences).to_string(index=False))
+    for difference in reports_df[differences].stack().dropna():
+        print(difference)
+    identical = reports_df["identical"] & reports_df["raw_identical"]
+    return 0 if identical.all() else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    raise SystemExit(main())
@@ -0,0 +1,117 @@
+"""
+Round trip check of the chunked result exports.
+
+Run from the repository root:
+
+    python -m benchmarks.verify_exports --crossings 10000 --chunk-rows 1000
+
+A synthetic comparison result is exported in every format, to a path and to a
+binary buffer, with chunks smaller than the result. Every export is read back
+and must hold the header and all the result rows, the exit code is 1 when an
+export differs.
+"""
+
+# build-in libs
+import argparse
+import io
+import logging
+import os
+import tempfile
+
+# installed libs
+import pandas as pd
+
+# custom libs
+from benchmarks.synthetic_data import generate_gmt_pase
+from data_cleaning.gmt_viajes_salida import clean_gmt_data
+from data_cleaning.pase import clean_pase_data
+from export_writers import EXPORT_FORMATS, export_result
+from gmt_pase_comparison import comparison
+
+# readers of every export format, values are compared as text
+READERS = {
+    "Excel": lambda source: pd.read_excel(source, sheet_name=None),
+    "CSV": lambda source: pd.read_csv(source, dtype=str, keep_default_na=False),
+    "Parquet": pd.read_parquet,
+}
+
+
+def exported_rows(export_format: str, source) -> pd.DataFrame:
+    # Rows of an export read back, sheets of an Excel export concatenated
+    exported = READERS[export_format](source)
+    if isinstance(exported, dict):
+        exported = pd.concat(exported.values(), ignore_index=True)
+    return exported
+
+
+def expected_rows(result_df: pd.DataFrame, export_format: str) -> pd.DataFrame:
+    # Result as the reader of the format gives it back
+    buffer = io.BytesIO()
+    if export_format == "CSV":
+        result_df.to_csv(buffer, index=False, encoding="utf-8")
+    elif export_format == "Excel":
+        result_df.to_excel(buffer, index=False)
+    else:
+        result_df.to_parquet(buffer, index=False)
+    buffer.seek(0)
+    return exported_rows(export_format, buffer)
+
+
+def verify_exports(result_df: pd.DataFrame, chunk_rows: int) -> pd.DataFrame:
+    """
+    Export result_df in every format to a path and a buffer and compare the rows.
+    """
+    reports = []
+    with tempfile.TemporaryDirectory() as directory:
+        for export_format, (extension, _) in EXPORT_FORMATS.items():
+            expected = expected_rows(result_df, export_format)
+            path = os.path.join(directory, f"result.{extension}")
+            buffer = io.BytesIO()
+            for output in [path, buffer]:
+                export_result(result_df, export_format, output, chunk_rows)
+                if output is buffer:
+                    buffer.seek(0)
+                exported = exported_rows(export_format, output)
+                difference = None
+                try:
+                    pd.testing.assert_frame_equal(exported, expected)
+                except AssertionError as e:
+                    difference = str(e)
+                reports.append(
+                    {
+                        "format": export_format,
+                        "output": "path" if output is path else "buffer",
+                        "rows": len(result_df),
+                        "exported_rows": len(exported),
+                        "identical": difference is None,
+                        "difference": difference,
+                    }
+                )
+    return pd.DataFrame(reports)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check chunked exports hold every row of the result"
+    )
+    parser.add_argument("--crossings", type=int, default=10_000)
+    parser.add_argument("--chunk-rows", type=int, default=1_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    gmt_df, pase_df = generate_gmt_pase(n_crossings=args.crossings, seed=args.seed)
+    result_df = comparison(clean_gmt_data(gmt_df), clean_pase_data(pase_df))
+    reports_df = verify_exports(result_df, args.chunk_rows)
+
+    print(reports_df.drop(columns=["difference"]).to_string(index=False))
+    for difference in reports_df["difference"].dropna():
+        print(difference)
+    return 0 if reports_df["identical"].all() else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    raise SystemExit(main())
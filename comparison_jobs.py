@@ -0,0 +1,159 @@
+"""
+Background comparison jobs shared by every session of the app.
+
+Jobs run on a thread pool of the server process, so the script thread of a
+session only polls their progress. Jobs beyond JOB_WORKERS wait in the queue.
+A job submitted with instrumentation enabled records its stages in its own
+recorder, kept with the job across the reruns that poll it.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+from instrumentation import instrumentation_enabled, new_recorder, recording
+
+# comparisons running at the same time, later jobs are queued
+JOB_WORKERS = 2
+
+# finished jobs not collected after this time are removed
+JOB_TTL_SECONDS = 60 * 60
+
+jobs = {}
+jobs_lock = threading.Lock()
+executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+
+
+def job_progress(job: dict):
+    """
+    Progress callback of a job, raises CancelledError once the job is cancelled.
+    """
+
+    def progress(done: int, total: int, num_econimico):
+        if job["cancel"].is_set():
+            raise CancelledError(f"Job {job['id']} cancelled")
+        job["done"], job["total"], job["unit"] = done, total, num_econimico
+
+    return progress
+
+
+def run_job(job: dict, func, args: tuple, kwargs: dict):
+    # Execute func in a worker thread and keep its result or error in the job
+    if job["cancel"].is_set():
+        job["status"] = "cancelled"
+        job["finished_at"] = time.time()
+        return
+    job["status"] = "running"
+    job["started_at"] = time.time()
+    try:
+        with recording(job["recorder"]):
+            job["result"] = func(*args, progress=job_progress(job), **kwargs)
+        job["status"] = "done"
+    except CancelledError:
+        logging.info(f"Job {job['id']} cancelled")
+        job["status"] = "cancelled"
+    except Exception as e:
+        logging.error(f"Job {job['id']} failed: {str(e)}")
+        job["status"] = "error"
+        job["error"] = str(e)
+    job["finished_at"] = time.time()
+
+
+def remove_expired_jobs():
+    # Drop finished jobs of sessions that never collected them
+    limite = time.time() - JOB_TTL_SECONDS
+    with jobs_lock:
+        for job_id in [
+            job_id
+            for job_id, job in jobs.items()
+            if job["finished_at"] is not None and job["finished_at"] < limite
+        ]:
+            del jobs[job_id]
+
+
+def submit_job(func, *args, **kwargs) -> str:
+    """
+    Queue func(*args, progress=..., **kwargs) and return the job id.
+
+    func receives a progress callback as comparison() does. When instrumentation
+    is enabled by the caller, the stages of the job are recorded in a new recorder
+    of the job, see job_recorder.
+    """
+    remove_expired_jobs()
+    job = {
+        "id": uuid.uuid4().hex,
+        "status": "queued",
+        "done": 0,
+        "total": None,
+        "unit": None,
+        "result": None,
+        "error": None,
+        "recorder": new_recorder() if instrumentation_enabled() else None,
+        "cancel": threading.Event(),
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+    }
+    with jobs_lock:
+        jobs[job["id"]] = job
+    context = contextvars.copy_context()
+    executor.submit(context.run, run_job, job, func, args, kwargs)
+    logging.info(f"Job {job['id']} queued")
+    return job["id"]
+
+
+def job_status(job_id: str) -> dict:
+    """
+    Status, progress and error of a job, None for unknown jobs.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return None
+    return {
+        key: value
+        for key, value in job.items()
+        if key not in ("result", "recorder", "cancel")
+    }
+
+
+def job_result(job_id: str):
+    """
+    Result of a finished job, None while it is not done.
+    """
+    job = jobs.get(job_id)
+    if job is None or job["status"] != "done":
+        return None
+    return job["result"]
+
+
+def job_recorder(job_id: str) -> dict:
+    """
+    Stage records of a job submitted with instrumentation enabled, None otherwise.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return None
+    return job["recorder"]
+
+
+def cancel_job(job_id: str):
+    """
+    Ask a job to stop, it stops after the No.Economico being compared.
+    """
+    job = jobs.get(job_id)
+    if job is not None:
+        job["cancel"].set()
+        if job["status"] == "queued":
+            job["status"] = "cancelled"
+
+
+def forget_job(job_id: str):
+    """
+    Cancel a job if needed and release its result.
+    """
+    cancel_job(job_id)
+    with jobs_lock:
+        jobs.pop(job_id, None)
@@ -0,0 +1,111 @@
+# build-in libs
+import logging
+import os
+
+# installed libs
+import numpy as np
+import pandas as pd
+
+# raw PASE columns identifying a crossing
+CROSSING_KEY_COLUMNS = ["Consecar", "Tag", "Fecha", "Hora"]
+
+# pending hashes merged into the sorted hashes of an index at least this many
+CROSSING_INDEX_MERGE_ROWS = 100_000
+
+
+def crossing_hashes(pase_df: pd.DataFrame) -> np.ndarray:
+    """
+    64-bit hash of the crossing key of every raw PASE row.
+
+    Key values are hashed as stripped strings, before any date parsing.
+    """
+    keys = pd.DataFrame(
+        {
+            column: pase_df[column].astype(str).str.strip()
+            for column in CROSSING_KEY_COLUMNS
+        }
+    )
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+def load_crossing_index(path: str = None) -> dict:
+    """
+    Crossing hashes seen before, read from path when it exists.
+
+    Without path the index only lives in memory, e.g. for the files of one upload.
+    Hashes are kept in a sorted array, new hashes in a set until
+    merge_pending_hashes adds them to the array.
+    """
+    hashes = np.empty(0, dtype="uint64")
+    if path is not None and os.path.exists(path):
+        hashes = np.sort(np.load(path), kind="stable")
+    logging.info(f"PASE crossing index loaded : {len(hashes)} crossings")
+    return {
+        "path": path,
+        "hashes": hashes,
+        "pending": set(),
+        "new_rows": 0,
+        "duplicated_rows": 0,
+    }
+
+
+def merge_pending_hashes(crossing_index: dict):
+    # Add the pending hashes to the sorted array. The stable sort of uint64 is a
+    # timsort: the sorted hashes are one run, only the pending ones are sorted
+    # before both runs are merged, O(n + k log k) for k pending hashes
+    pendientes = crossing_index["pending"]
+    if len(pendientes) > 0:
+        nuevos = np.fromiter(pendientes, dtype="uint64", count=len(pendientes))
+        crossing_index["hashes"] = np.sort(
+            np.concatenate([crossing_index["hashes"], nuevos]), kind="stable"
+        )
+        crossing_index["pending"] = set()
+
+
+def save_crossing_index(crossing_index: dict):
+    # Persist the hashes of an index loaded from a path
+    merge_pending_hashes(crossing_index)
+    path = crossing_index["path"]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.save(path, crossing_index["hashes"])
+    logging.info(
+        f"PASE crossing index saved : {len(crossing_index['hashes'])} crossings in {path}"
+    )
+
+
+def in_sorted_hashes(sorted_hashes: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+    # Membership of hashes in a sorted array, one binary search per hash
+    if len(sorted_hashes) == 0:
+        return np.zeros(len(hashes), dtype=bool)
+    posiciones = np.searchsorted(sorted_hashes, hashes)
+    posiciones[posiciones == len(sorted_hashes)] = 0
+    return sorted_hashes[posiciones] == hashes
+
+
+def skip_seen_crossings(pase_df: pd.DataFrame, crossing_index: dict) -> pd.DataFrame:
+    """
+    Drop raw PASE rows already in the index or repeated in pase_df and add the
+    remaining crossings to the index.
+
+    Every row is one binary search in the sorted hashes, O(log n), and one set
+    lookup in the pending hashes, the index is updated in place. Pending hashes
+    are merged once they reach CROSSING_INDEX_MERGE_ROWS or a quarter of the
+    sorted hashes, so merges also cost O(log n) per row on average.
+    """
+    hashes = crossing_hashes(pase_df)
+    pendientes = crossing_index["pending"]
+    vistos = in_sorted_hashes(crossing_index["hashes"], hashes)
+    vistos |= np.fromiter(
+        (h in pendientes for h in hashes.tolist()), dtype=bool, count=len(hashes)
+    )
+    vistos |= pd.Series(hashes).duplicated().to_numpy()
+
+    nuevos = hashes[~vistos]
+    pendientes.update(nuevos.tolist())
+    if len(pendientes) >= max(
+        CROSSING_INDEX_MERGE_ROWS, len(crossing_index["hashes"]) // 4
+    ):
+        merge_pending_hashes(crossing_index)
+    crossing_index["new_rows"] += len(nuevos)
+    crossing_index["duplicated_rows"] += int(vistos.sum())
+    return pase_df[~vistos]
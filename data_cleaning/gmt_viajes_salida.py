@@ -1,10 +1,23 @@
 # build-in libs
+import argparse
+import hashlib
+import importlib.util
+import io
 import logging
+import os
 from datetime import datetime
 
 # installed libs
+import numpy as np
 import pandas as pd
 
+# local libs
+from data_cleaning.schema import compact_dtypes
+from instrumentation import timed_stage
+
+# parsed GM Transport workbooks, stored by content hash
+GMT_CACHE_DIR = os.path.join("db", "cache")
+
 
 # Logging config
 def setup_logger():
@@ -14,19 +27,91 @@ def setup_logger():
     )
 
 
-def add_dataset_information(df: pd.DataFrame):
+def add_dataset_information(df: pd.DataFrame, current_dataset_id: int = 0):
     # Add db_created_at column
     today_datetime = datetime.now()
     today_datetime = today_datetime.replace(microsecond=0)
     today_datetime = today_datetime.isoformat()
     df["db_created_at"] = today_datetime
 
-    # Add dataset_id column
-    current_dataset_id = 0
+    # Add dataset_id column, next id after the last stored dataset
     df["db_id"] = current_dataset_id + 1
     return df
 
 
+def default_excel_engine() -> str:
+    # calamine parses xlsx files much faster than openpyxl when it is installed
+    if importlib.util.find_spec("python_calamine") is not None:
+        return "calamine"
+    return "openpyxl"
+
+
+def read_file_bytes(file) -> bytes:
+    # Accept a path, an uploaded file or any binary file object
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "rb") as f:
+            return f.read()
+    if hasattr(file, "getvalue"):
+        return file.getvalue()
+    return file.read()
+
+
+@timed_stage("load_gmt")
+def load_gmt_data(
+    file, engine: str = None, cache_dir: str = GMT_CACHE_DIR
+) -> pd.DataFrame:
+    """
+    Read a GM Transport Excel export.
+
+    The parsed workbook is cached as Parquet under the SHA-256 of the file bytes,
+    so loading the same workbook again skips the Excel parse. engine is passed to
+    pd.read_excel, calamine is used by default when installed. cache_dir=None
+    disables the cache.
+    """
+    content = read_file_bytes(file)
+    content_hash = hashlib.sha256(content).hexdigest()
+
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, f"gmt_{content_hash}.parquet")
+        if os.path.exists(cache_path):
+            logging.info(f"GM Transport file loaded from cache {cache_path}")
+            return pd.read_parquet(cache_path)
+
+    engine = engine or default_excel_engine()
+    viajes_df = pd.read_excel(io.BytesIO(content), engine=engine)
+    logging.info(
+        f"GM Transport file parsed with {engine} : rows {viajes_df.shape[0]} columns {viajes_df.shape[1]}"
+    )
+
+    if cache_path is not None:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            viajes_df.to_parquet(cache_path, index=False)
+        except Exception as e:
+            # columns mixing types can not be stored as Parquet
+            logging.warning(f"GM Transport file is not cached: {str(e)}")
+    return viajes_df
+
+
+def concat_gmt_data(dfs: list) -> pd.DataFrame:
+    """
+    Concatenate GM Transport exports before cleaning, so trips spanning several
+    files get their min and max departure from all of them. Rows repeated in
+    overlapping exports are kept once.
+    """
+    if len(dfs) == 1:
+        return dfs[0]
+    viajes_df = pd.concat(dfs, ignore_index=True)
+    rows = len(viajes_df)
+    viajes_df = viajes_df.drop_duplicates(ignore_index=True)
+    logging.info(
+        f"GM Transport files concatenated : {len(dfs)} files rows {len(viajes_df)}, {rows - len(viajes_df)} repeated rows removed"
+    )
+    return viajes_df
+
+
+@timed_stage("clean_gmt")
 def clean_gmt_data(viajes_df: pd.DataFrame):
     # * read GM Transport
     # viajes_df = pd.read_excel("src/Viajes_por_unidad_2025_012.xlsx")
@@ -34,8 +119,8 @@ def clean_gmt_data(viajes_df: pd.DataFrame):
         f"GM Transport loaded data : rows {viajes_df.shape[0]} columns {viajes_df.shape[1]}"
     )
 
-    # remove spaces from column names
-    viajes_df.columns = viajes_df.columns.str.strip()
+    # remove spaces from column names, renamed copies share the input data
+    viajes_df = viajes_df.rename(columns=str.strip)
 
     # rename columns names
     columns_to_rename = {"Viaje Docto.": "Viaje", "Tractocamión": "Unidad"}
@@ -60,59 +145,41 @@ def clean_gmt_data(viajes_df: pd.DataFrame):
     )
 
     """ Following process is needed to get just Velox shipments """
-    # get Viajes where Unidad contains "VELOX"
-    numero_ma_part1 = viajes_df[viajes_df["Unidad"].str.contains("VELOX")]
-
-    # get Viajes where Unidad is 3502
-    numero_ma_part2 = viajes_df[viajes_df["Unidad"] == "3502"]
-
-    # concatenate both dataframes
-    numero_ma = pd.concat([numero_ma_part1, numero_ma_part2])
-    numero_ma = numero_ma.drop_duplicates()
-    numero_ma = numero_ma["Viaje"].unique()
+    # single mask of Velox units: Unidad contains "VELOX" or is 3502
+    es_velox = viajes_df["Unidad"].str.contains("VELOX", na=False)
+    es_flota = es_velox | (viajes_df["Unidad"] == "3502")
+    numero_ma = viajes_df.loc[es_flota, "Viaje"].unique()
 
     # filter rows with target numero_ma
-    viajes_df = viajes_df[viajes_df["Viaje"].isin(numero_ma)]
+    en_viaje_ma = viajes_df["Viaje"].isin(numero_ma)
+    viajes_df = viajes_df[en_viaje_ma]
 
-    # group by Viaje and get min and max Fecha y Hora de Salida
-    last_datetime_by_ship = viajes_df.groupby("Viaje").agg(
-        {target_datetime_column: ["min", "max"]}
-    )
-
-    if len(last_datetime_by_ship) != len(numero_ma):
+    # min and max Fecha y Hora de Salida by Viaje, rows of other units included
+    fechas_por_viaje = viajes_df.groupby("Viaje")[target_datetime_column]
+    if fechas_por_viaje.ngroups != len(numero_ma):
         logging.error(
-            f"Amount of unique Viajes {len(numero_ma)} is different from last_datetime_by_ship {len(last_datetime_by_ship)}"
+            f"Amount of unique Viajes {len(numero_ma)} is different from grouped Viajes {fechas_por_viaje.ngroups}"
         )
-
-    # add new columns to original df
-    viajes_df["fecha_salida_ma_min"] = viajes_df["Viaje"].map(
-        last_datetime_by_ship[target_datetime_column]["min"]
-    )
-    viajes_df["fecha_salida_ma_max"] = viajes_df["Viaje"].map(
-        last_datetime_by_ship[target_datetime_column]["max"]
-    )
-
-    # filter Unidad with Velox ships
-    viajes_part1 = viajes_df[viajes_df["Unidad"].str.contains("VELOX")]
-    viajes_part2 = viajes_df[viajes_df["Unidad"] == "3502"]
-    viajes_df = pd.concat([viajes_part1, viajes_part2])
+    viajes_df["fecha_salida_ma_min"] = fechas_por_viaje.transform("min")
+    viajes_df["fecha_salida_ma_max"] = fechas_por_viaje.transform("max")
+
+    # filter Unidad with Velox ships, VELOX units first and then 3502
+    es_velox = es_velox[en_viaje_ma]
+    es_flota = es_flota[en_viaje_ma]
+    viajes_df = viajes_df[es_flota].iloc[
+        np.argsort(~es_velox[es_flota].to_numpy(), kind="stable")
+    ]
 
     """ Continue with extracting and cleaning general data """
-    # extract number from column 'Unidad'
-    viajes_df["No.Economico"] = viajes_df["Unidad"].str.extract(r"(\d+)")
-
-    # split Hora from Fecha Salida verifying follwing format '00:00:00'
-    viajes_df["Hora Salida"] = viajes_df[target_datetime_column].dt.strftime("%H:%M:%S")
-    # viajes_df["Hora Salida"] = pd.to_datetime(
-    # viajes_df["Hora Salida"], format="%H:%M:%S"
-    # ).dt.time
-
-    # remove hours from Fecha Salida
-    viajes_df["Fecha Salida"] = viajes_df[target_datetime_column].dt.strftime(
-        "%d/%m/%Y"
-    )
-    viajes_df["Fecha Salida"] = pd.to_datetime(
-        viajes_df["Fecha Salida"], format="%d/%m/%Y"
+    # extract number from column 'Unidad', once for every distinct Unidad
+    codigos, unidades = pd.factorize(viajes_df["Unidad"])
+    numeros = pd.Series(unidades).str.extract(r"(\d+)")[0].to_numpy()
+    viajes_df["No.Economico"] = numeros[codigos]
+
+    # split Fecha Salida and Hora Salida (timedelta64 time of day)
+    viajes_df["Fecha Salida"] = viajes_df[target_datetime_column].dt.normalize()
+    viajes_df["Hora Salida"] = (
+        viajes_df[target_datetime_column] - viajes_df["Fecha Salida"]
     )
 
     # reorder column position
@@ -123,17 +190,11 @@ def clean_gmt_data(viajes_df: pd.DataFrame):
     ]
 
     # convert columns to correct data types
-    viajes_df["Fecha y Hora de Salida"] = pd.to_datetime(
-        viajes_df["Fecha y Hora de Salida"], format="%d/%m/%Y %H:%M:%S"
-    )
-    viajes_df["fecha_salida_ma_min"] = pd.to_datetime(
-        viajes_df["fecha_salida_ma_min"], format="%Y-%m-%d %H:%M:%S"
-    )
-    viajes_df["fecha_salida_ma_max"] = pd.to_datetime(
-        viajes_df["fecha_salida_ma_max"], format="%Y-%m-%d %H:%M:%S"
-    )
     viajes_df["No.Economico"] = viajes_df["No.Economico"].astype(int)
 
+    # store categoricals and downcasted numbers
+    viajes_df = compact_dtypes(viajes_df, "GM Transport")
+
     # viajes_df = add_dataset_information(viajes_df)
     # viajes_df.to_csv("db/gmt_viajes_por_unidad.csv", index=False)
     logging.info(
@@ -144,4 +205,13 @@ def clean_gmt_data(viajes_df: pd.DataFrame):
 
 if __name__ == "__main__":
     setup_logger()
-    clean_gmt_data()
+    parser = argparse.ArgumentParser(
+        description="Load and clean a GM Transport Excel file"
+    )
+    parser.add_argument("file")
+    parser.add_argument("--output", default=None, help="Save the cleaned data as CSV")
+    args = parser.parse_args()
+
+    viajes_df = clean_gmt_data(load_gmt_data(args.file))
+    if args.output is not None:
+        viajes_df.to_csv(args.output, index=False)
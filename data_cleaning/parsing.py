@@ -0,0 +1,46 @@
+# build-in libs
+import logging
+
+# installed libs
+import pandas as pd
+
+
+def parse_unique_datetimes(
+    values: pd.Series, formats: list, dayfirst: bool = False
+) -> pd.Series:
+    """
+    Parse date or time strings once per distinct value and broadcast the result.
+
+    Every format is tried strictly on the values not parsed yet, only the values
+    matching none of them are parsed with format="mixed". The amount of rows
+    that needed the mixed fallback is logged.
+    """
+    codigos, unicos = pd.factorize(values)
+    unicos = pd.Series(unicos, dtype=object)
+
+    parsed = pd.Series(pd.NaT, index=unicos.index, dtype="datetime64[us]")
+    pendientes = unicos.index
+    for formato in formats:
+        if len(pendientes) == 0:
+            break
+        intento = pd.to_datetime(unicos[pendientes], format=formato, errors="coerce")
+        parsed[pendientes] = intento
+        pendientes = pendientes[intento.isna().to_numpy()]
+
+    fallback_rows = 0
+    if len(pendientes) > 0:
+        parsed[pendientes] = pd.to_datetime(
+            unicos[pendientes], format="mixed", dayfirst=dayfirst
+        )
+        fallback_rows = int(pd.Series(codigos).isin(pendientes).sum())
+    if fallback_rows > 0:
+        logging.warning(
+            f"{values.name} : {fallback_rows} rows ({len(pendientes)} distinct values) parsed with format mixed"
+        )
+    logging.info(
+        f"{values.name} parsed : {len(unicos)} distinct values for {len(values)} rows, {fallback_rows} rows with format mixed"
+    )
+
+    # codes of missing values are -1, they are filled with NaT
+    resultado = parsed.array.take(codigos, allow_fill=True)
+    return pd.Series(resultado, index=values.index, name=values.name)
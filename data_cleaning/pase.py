@@ -1,10 +1,21 @@
 # build-in libs
+import argparse
 import logging
 from datetime import datetime
 
 # installed libs
 import pandas as pd
 
+# local libs
+from data_cleaning.crossing_index import skip_seen_crossings
+from data_cleaning.parsing import parse_unique_datetimes
+from data_cleaning.schema import compact_dtypes
+from instrumentation import timed_stage
+
+# formats of PASE dates and times, other values are parsed with format="mixed"
+FECHA_FORMATS = ["%d/%m/%Y"]
+HORA_FORMATS = ["%H:%M:%S", "%H:%M"]
+
 
 # Logging config
 def setup_logger():
@@ -14,19 +25,24 @@ def setup_logger():
     )
 
 
-def add_dataset_information(df: pd.DataFrame):
+def add_dataset_information(df: pd.DataFrame, current_dataset_id: int = 0):
     # Add db_created_at column
     today_datetime = datetime.now()
     today_datetime = today_datetime.replace(microsecond=0)
     today_datetime = today_datetime.isoformat()
     df["db_created_at"] = today_datetime
 
-    # Add dataset_id column
-    current_dataset_id = 0
+    # Add dataset_id column, next id after the last stored dataset
     df["db_id"] = current_dataset_id + 1
     return df
 
 
+def time_of_day(datetimes: pd.Series) -> pd.Series:
+    # Time elapsed since midnight as timedelta64
+    return datetimes - datetimes.dt.normalize()
+
+
+@timed_stage("clean_pase")
 def clean_pase_data(pase_df: pd.DataFrame):
     # * read PASE
     # pase_df = pd.read_csv("src/cruces_PASE_2025_012.csv", sep=",", encoding="utf-8")
@@ -34,34 +50,41 @@ def clean_pase_data(pase_df: pd.DataFrame):
         f"PASE loaded data : rows {pase_df.shape[0]} columns {pase_df.shape[1]}"
     )
 
-    # format columns
-    pase_df["Importe"] = (
-        pase_df["Importe"].replace("[$,]", "", regex=True).astype(float)
-    )
-    pase_df["Fecha"] = pd.to_datetime(pase_df["Fecha"], format="%d/%m/%Y")
-
-    # sort values
-    pase_df = pase_df.sort_values(
-        by=["Fecha", "Hora", "No.Economico"], ascending=[True, True, True]
+    # format columns, assign returns a new dataframe and the input is not modified
+    pase_df = pase_df.assign(
+        Importe=pase_df["Importe"].replace("[$,]", "", regex=True).astype(float),
+        Fecha=parse_unique_datetimes(pase_df["Fecha"], FECHA_FORMATS, dayfirst=True),
     )
 
     # convert columns to correct data types
     pase_df["Tag"] = pase_df["Tag"].str.strip()
     pase_df["No.Economico"] = pase_df["No.Economico"].astype(int)
-    pase_df["Fecha"] = pd.to_datetime(pase_df["Fecha"], format="%Y-%m-%d")
-    pase_df["Hora"] = pd.to_datetime(pase_df["Hora"], format="mixed").dt.time
+    pase_df["Hora"] = time_of_day(parse_unique_datetimes(pase_df["Hora"], HORA_FORMATS))
     pase_df["Caseta"] = pase_df["Caseta"].str.strip()
     pase_df["Carril"] = pase_df["Carril"].str.strip()
     pase_df["Clase"] = pase_df["Clase"].astype(int)
     pase_df["Importe"] = pase_df["Importe"].astype(float)
-    pase_df["Fecha Aplicacion"] = pd.to_datetime(
-        pase_df["Fecha Aplicacion"], format="%d/%m/%Y"
+    pase_df["Fecha Aplicacion"] = parse_unique_datetimes(
+        pase_df["Fecha Aplicacion"], FECHA_FORMATS, dayfirst=True
+    )
+    pase_df["Hora Aplicacion"] = time_of_day(
+        parse_unique_datetimes(pase_df["Hora Aplicacion"], HORA_FORMATS)
     )
-    pase_df["Hora Aplicacion"] = pd.to_datetime(
-        pase_df["Hora Aplicacion"], format="mixed"
-    ).dt.time
     pase_df["Consecar"] = pase_df["Consecar"].astype(int)
 
+    # datetime of the crossing, Hora is a timedelta64 time of day
+    pase_df["pase_datetime"] = pase_df["Fecha"] + pase_df["Hora"]
+
+    # sort values once Hora is parsed, crossings at the same time keep their file order
+    pase_df = pase_df.sort_values(
+        by=["Fecha", "Hora", "No.Economico"],
+        ascending=[True, True, True],
+        kind="stable",
+    )
+
+    # store categoricals and downcasted numbers
+    pase_df = compact_dtypes(pase_df, "PASE")
+
     # pase_df.to_csv("db/pase_cruces.csv", index=False)
     logging.info(
         f"PASE final dataframe : rows {pase_df.shape[0]} columns {pase_df.shape[1]}"
@@ -69,6 +92,68 @@ def clean_pase_data(pase_df: pd.DataFrame):
     return pase_df
 
 
+def filter_pase_dates(pase_df: pd.DataFrame, fecha_inicio=None, fecha_fin=None):
+    # Keep raw PASE rows with Fecha inside [fecha_inicio, fecha_fin]
+    fechas = parse_unique_datetimes(pase_df["Fecha"], FECHA_FORMATS, dayfirst=True)
+    in_window = pd.Series(True, index=pase_df.index)
+    if fecha_inicio is not None:
+        in_window &= fechas >= fecha_inicio
+    if fecha_fin is not None:
+        in_window &= fechas <= fecha_fin
+    return pase_df[in_window]
+
+
+@timed_stage("load_pase")
+def load_pase_data(
+    file,
+    fecha_inicio=None,
+    fecha_fin=None,
+    chunksize: int = 200_000,
+    crossing_index: dict = None,
+) -> pd.DataFrame:
+    """
+    Read and clean a PASE CSV file in chunks.
+
+    Rows outside [fecha_inicio, fecha_fin] are dropped from every chunk before
+    cleaning, so peak memory depends on the date window and not on the file size.
+    With a crossing_index, crossings already in it are dropped before cleaning as
+    well, see skip_seen_crossings.
+    """
+    cleaned_chunks = []
+    rows_read = 0
+    for chunk in pd.read_csv(file, sep=",", encoding="utf-8", chunksize=chunksize):
+        rows_read += len(chunk)
+        chunk = filter_pase_dates(chunk, fecha_inicio, fecha_fin)
+        if crossing_index is not None:
+            chunk = skip_seen_crossings(chunk, crossing_index)
+        if len(chunk) > 0 or len(cleaned_chunks) == 0:
+            cleaned_chunks.append(clean_pase_data(chunk))
+    logging.info(
+        f"PASE streamed data : rows read {rows_read} rows kept in date window {sum(len(c) for c in cleaned_chunks)}"
+    )
+    if crossing_index is not None:
+        logging.info(
+            f"PASE crossing index : {crossing_index['new_rows']} new rows, {crossing_index['duplicated_rows']} duplicated rows"
+        )
+
+    # sort values across chunks and restore categoricals lost in the concatenation
+    pase_df = pd.concat(cleaned_chunks, ignore_index=True)
+    pase_df = pase_df.sort_values(
+        by=["Fecha", "Hora", "No.Economico"],
+        ascending=[True, True, True],
+        kind="stable",
+    )
+    pase_df = compact_dtypes(pase_df, "PASE")
+    return pase_df
+
+
 if __name__ == "__main__":
     setup_logger()
-    clean_pase_data()
+    parser = argparse.ArgumentParser(description="Load and clean a PASE CSV file")
+    parser.add_argument("file")
+    parser.add_argument("--output", default=None, help="Save the cleaned data as CSV")
+    args = parser.parse_args()
+
+    pase_df = load_pase_data(args.file)
+    if args.output is not None:
+        pase_df.to_csv(args.output, index=False)
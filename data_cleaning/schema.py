@@ -0,0 +1,88 @@
+# build-in libs
+import logging
+
+# installed libs
+import numpy as np
+import pandas as pd
+
+# string columns with few distinct values, stored as category
+CATEGORY_COLUMNS = ["Tag", "Caseta", "Carril", "Unidad", "Ruta"]
+
+
+def enable_copy_on_write():
+    """
+    Use pandas copy-on-write, always on since pandas 3.
+
+    Slices and renamed dataframes share memory with their source until one of
+    them is modified, so no defensive .copy() is needed between the cleaning
+    and the comparison.
+    """
+    if int(pd.__version__.split(".")[0]) < 3:
+        pd.set_option("mode.copy_on_write", True)
+
+
+enable_copy_on_write()
+
+
+def memory_usage_mb(df: pd.DataFrame) -> float:
+    # Deep memory usage of a dataframe in MB
+    return df.memory_usage(deep=True).sum() / 1024**2
+
+
+def downcast_float(column: pd.Series) -> pd.Series:
+    # Use float32 only when no value changes, money columns must stay exact
+    downcasted = pd.to_numeric(column, downcast="float")
+    if np.array_equal(
+        downcasted.to_numpy(dtype="float64"), column.to_numpy(), equal_nan=True
+    ):
+        return downcasted
+    return column
+
+
+def compact_dtypes(df: pd.DataFrame, name: str) -> pd.DataFrame:
+    """
+    Store a cleaned dataframe with compact dtypes.
+
+    CATEGORY_COLUMNS become categoricals, integer columns are downcasted to the
+    smallest type holding their values and float columns to float32 when lossless.
+    """
+    memory_before = memory_usage_mb(df)
+
+    # columns are replaced in a shallow copy, the input dataframe is not modified
+    df = df.copy(deep=False)
+    for column in df.columns:
+        dtype = df[column].dtype
+        if column in CATEGORY_COLUMNS:
+            if not isinstance(dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype("category")
+        elif pd.api.types.is_bool_dtype(dtype):
+            continue
+        elif pd.api.types.is_integer_dtype(dtype):
+            df[column] = pd.to_numeric(df[column], downcast="integer")
+        elif pd.api.types.is_float_dtype(dtype):
+            df[column] = downcast_float(df[column])
+
+    memory_after = memory_usage_mb(df)
+    logging.info(
+        f"{name} memory usage : {memory_before:.2f} MB before, {memory_after:.2f} MB after compact dtypes"
+    )
+    return df
+
+
+def expand_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Undo compact_dtypes for output: categoricals back to the dtype of their
+    categories, integer columns to int64 and float columns to float64.
+
+    Nullable and object columns are kept as they are.
+    """
+    df = df.copy(deep=False)
+    for column in df.columns:
+        dtype = df[column].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(dtype.categories.dtype)
+        elif isinstance(dtype, np.dtype) and dtype.kind in "iu":
+            df[column] = df[column].astype("int64")
+        elif isinstance(dtype, np.dtype) and dtype.kind == "f":
+            df[column] = df[column].astype("float64")
+    return df
@@ -0,0 +1,231 @@
+import hashlib
+import logging
+import os
+
+import pandas as pd
+
+from data_cleaning.crossing_index import load_crossing_index, save_crossing_index
+from data_cleaning.pase import load_pase_data
+from data_cleaning.schema import compact_dtypes
+from gmt_pase_comparison import FECHA_INICIO_COMPARACION, comparison
+
+# cleaned GM Transport and PASE rows, partitioned by month and No.Economico
+DATASET_STORE_DIR = os.path.join("db", "dataset")
+
+# hashes of the raw PASE crossings added to the store
+PASE_CROSSING_INDEX = "pase_crossings.npy"
+
+# date column used for the month partition of every source
+PARTITION_DATE_COLUMNS = {"gmt": "Fecha Salida", "pase": "Fecha"}
+
+# columns identifying a row, the last uploaded row is kept for duplicates
+DEDUP_COLUMNS = {
+    "gmt": ["Viaje", "No.Economico", "Fecha y Hora de Salida"],
+    "pase": ["Consecar"],
+}
+
+# row order of the cleaned dataframes
+SORT_COLUMNS = {
+    "gmt": ["Fecha y Hora de Salida", "Unidad"],
+    "pase": ["Fecha", "Hora", "No.Economico"],
+}
+
+
+def drop_duplicate_rows(df: pd.DataFrame, source: str) -> pd.DataFrame:
+    """
+    Remove rows uploaded more than once and restore the order of the source.
+    """
+    rows = len(df)
+    df = df.drop_duplicates(subset=DEDUP_COLUMNS[source], keep="last")
+    if len(df) < rows:
+        logging.info(f"{source} duplicated rows removed : {rows - len(df)}")
+    return df.sort_values(by=SORT_COLUMNS[source], kind="stable")
+
+
+def combine_cleaned_data(dfs: list, source: str) -> pd.DataFrame:
+    """
+    Concatenate cleaned dataframes of several files of the same source.
+    """
+    if len(dfs) == 1:
+        return dfs[0]
+    df = drop_duplicate_rows(pd.concat(dfs, ignore_index=True), source)
+    # categoricals with different categories are concatenated as strings
+    return compact_dtypes(df, source)
+
+
+def partition_path(store_dir: str, source: str, mes: str, num_econimico) -> str:
+    return os.path.join(
+        store_dir, source, f"mes={mes}", f"no_economico={num_econimico}", "part.parquet"
+    )
+
+
+def store_cleaned_data(
+    df: pd.DataFrame, source: str, store_dir: str = DATASET_STORE_DIR
+) -> int:
+    """
+    Merge cleaned rows into the partitions of their month and No.Economico.
+
+    Returns the amount of partitions written.
+    """
+    meses = df[PARTITION_DATE_COLUMNS[source]].dt.to_period("M")
+    partitions = 0
+    for (mes, num_econimico), partition_df in df.groupby(
+        [meses, "No.Economico"], sort=False, observed=True
+    ):
+        path = partition_path(store_dir, source, mes, num_econimico)
+        if os.path.exists(path):
+            partition_df = pd.concat(
+                [pd.read_parquet(path), partition_df], ignore_index=True
+            )
+        partition_df = drop_duplicate_rows(partition_df, source)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partition_df.to_parquet(path, index=False)
+        partitions += 1
+    logging.info(f"{source} rows {len(df)} stored in {partitions} partitions")
+    return partitions
+
+
+def ingest_pase_files(
+    files: list,
+    fecha_inicio=None,
+    fecha_fin=None,
+    store_dir: str = DATASET_STORE_DIR,
+) -> dict:
+    """
+    Add the crossings of raw PASE files that are not in the store yet.
+
+    Crossings of overlapping statements are found in the crossing index of the
+    store and skipped before parsing. Returns the new and duplicated row counts.
+    """
+    crossing_index = load_crossing_index(os.path.join(store_dir, PASE_CROSSING_INDEX))
+    cleaned = [
+        load_pase_data(file, fecha_inicio, fecha_fin, crossing_index=crossing_index)
+        for file in files
+    ]
+    pase_df = combine_cleaned_data(cleaned, "pase")
+    partitions = 0
+    if len(pase_df) > 0:
+        partitions = store_cleaned_data(pase_df, "pase", store_dir)
+    save_crossing_index(crossing_index)
+    return {
+        "new_rows": crossing_index["new_rows"],
+        "duplicated_rows": crossing_index["duplicated_rows"],
+        "partitions": partitions,
+    }
+
+
+def stored_partitions(
+    source: str, fecha_inicio=None, fecha_fin=None, store_dir: str = DATASET_STORE_DIR
+) -> list:
+    """
+    Paths of the partitions of the months overlapping [fecha_inicio, fecha_fin].
+    """
+    source_dir = os.path.join(store_dir, source)
+    if not os.path.isdir(source_dir):
+        return []
+
+    mes_inicio = None if fecha_inicio is None else f"{pd.Timestamp(fecha_inicio):%Y-%m}"
+    mes_fin = None if fecha_fin is None else f"{pd.Timestamp(fecha_fin):%Y-%m}"
+    paths = []
+    for mes_dir in sorted(os.listdir(source_dir)):
+        mes = mes_dir.removeprefix("mes=")
+        if (mes_inicio is not None and mes < mes_inicio) or (
+            mes_fin is not None and mes > mes_fin
+        ):
+            continue
+        for unidad_dir in sorted(os.listdir(os.path.join(source_dir, mes_dir))):
+            path = os.path.join(source_dir, mes_dir, unidad_dir, "part.parquet")
+            if os.path.exists(path):
+                paths.append(path)
+    return paths
+
+
+def partitions_signature(paths: list) -> str:
+    # Changes when a partition is added, removed or rewritten
+    signature = hashlib.sha256()
+    for path in paths:
+        stat = os.stat(path)
+        signature.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return signature.hexdigest()
+
+
+def load_stored_data(
+    source: str, fecha_inicio=None, fecha_fin=None, store_dir: str = DATASET_STORE_DIR
+) -> pd.DataFrame:
+    """
+    Load the stored rows of a source with dates inside [fecha_inicio, fecha_fin].
+
+    Only the partitions of the months in the window are read.
+    """
+    paths = stored_partitions(source, fecha_inicio, fecha_fin, store_dir)
+    if len(paths) == 0:
+        raise ValueError(f"No {source} data stored for the selected dates")
+
+    df = pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+    fechas = df[PARTITION_DATE_COLUMNS[source]]
+    in_window = pd.Series(True, index=df.index)
+    if fecha_inicio is not None:
+        in_window &= fechas >= pd.Timestamp(fecha_inicio)
+    if fecha_fin is not None:
+        in_window &= fechas <= pd.Timestamp(fecha_fin)
+    df = df[in_window].sort_values(by=SORT_COLUMNS[source], kind="stable")
+    logging.info(f"{source} rows {len(df)} loaded from {len(paths)} partitions")
+    return compact_dtypes(df, source)
+
+
+def comparison_window_dates(fecha_inicio, fecha_fin) -> tuple:
+    """
+    Stored dates needed to compare [fecha_inicio, fecha_fin].
+
+    The previous and the next month are compared as well: crossings at the start
+    of the window can belong to a trip that departed before it, and LINCOLN
+    crossings at the end to a trip that departs after it.
+    """
+    fecha_inicio = max(pd.Timestamp(fecha_inicio), FECHA_INICIO_COMPARACION)
+    inicio = fecha_inicio.normalize().replace(day=1) - pd.DateOffset(months=1)
+    fin = pd.Timestamp(fecha_fin).normalize() + pd.offsets.MonthEnd(2)
+    return inicio, fin
+
+
+def comparison_window_signature(
+    fecha_inicio, fecha_fin, store_dir: str = DATASET_STORE_DIR
+) -> str:
+    """
+    Signature of the partitions read by load_comparison_window.
+    """
+    inicio, fin = comparison_window_dates(fecha_inicio, fecha_fin)
+    paths = stored_partitions("gmt", inicio, fin, store_dir)
+    paths += stored_partitions("pase", inicio, fin, store_dir)
+    return partitions_signature(paths)
+
+
+def load_comparison_window(
+    fecha_inicio, fecha_fin, store_dir: str = DATASET_STORE_DIR
+) -> tuple:
+    """
+    Load the GM Transport and PASE partitions needed to compare
+    [fecha_inicio, fecha_fin], one month before and after it included.
+    """
+    inicio, fin = comparison_window_dates(fecha_inicio, fecha_fin)
+    viajes_df = load_stored_data("gmt", inicio, fin, store_dir)
+    pase_df = load_stored_data("pase", inicio, fin, store_dir)
+    return viajes_df, pase_df
+
+
+def window_records(records_df: pd.DataFrame, fecha_inicio, fecha_fin) -> pd.DataFrame:
+    # Comparison rows with crossing Fecha inside [fecha_inicio, fecha_fin]
+    fechas = records_df["Fecha"]
+    return records_df[
+        (fechas >= pd.Timestamp(fecha_inicio)) & (fechas <= pd.Timestamp(fecha_fin))
+    ]
+
+
+def stored_comparison(
+    fecha_inicio, fecha_fin, store_dir: str = DATASET_STORE_DIR, workers: int = 1
+) -> pd.DataFrame:
+    """
+    Compare the stored GM Transport and PASE rows of a reconciliation window.
+    """
+    viajes_df, pase_df = load_comparison_window(fecha_inicio, fecha_fin, store_dir)
+    records_df = comparison(viajes_df, pase_df, workers=workers)
+    return window_records(records_df, fecha_inicio, fecha_fin)
@@ -0,0 +1,135 @@
+"""
+Chunked writers for the comparison results.
+
+Every writer takes a dataframe and a path or binary file object and writes it
+EXPORT_CHUNK_ROWS rows at a time, so no text or workbook copy of the whole result
+is built in memory before it reaches the output.
+"""
+
+import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xlsxwriter
+
+# rows converted and written at once
+EXPORT_CHUNK_ROWS = 50_000
+
+# Excel sheets hold 1,048,576 rows, the header included
+EXCEL_MAX_ROWS = 1_048_576
+
+# file extension and mime type of every export format
+EXPORT_FORMATS = {
+    "Excel": (
+        "xlsx",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ),
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+
+def iter_chunks(df: pd.DataFrame, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    # Consecutive row slices of a dataframe
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start : start + chunk_rows]
+
+
+def write_csv(df: pd.DataFrame, output, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """
+    Write a dataframe as UTF-8 CSV, the header goes with the first chunk.
+    """
+    if len(df) == 0:
+        df.to_csv(output, index=False, encoding="utf-8", sep=",")
+        return
+    # chunks after the first are appended, a path is not truncated again
+    for i, chunk in enumerate(iter_chunks(df, chunk_rows)):
+        chunk.to_csv(
+            output,
+            mode="w" if i == 0 else "a",
+            index=False,
+            header=i == 0,
+            encoding="utf-8",
+            sep=",",
+        )
+
+
+def excel_cell(value, datetime_format, date_format):
+    # Value and cell format as pandas.to_excel writes them, None for empty cells
+    if value is None or value is pd.NaT or value is pd.NA:
+        return None, None
+    if pd.api.types.is_float(value) and value != value:
+        return None, None
+    if isinstance(value, datetime.datetime):
+        return value, datetime_format
+    if isinstance(value, datetime.date):
+        return value, date_format
+    if pd.api.types.is_integer(value):
+        return int(value), None
+    if pd.api.types.is_float(value):
+        return float(value), None
+    if pd.api.types.is_bool(value):
+        return bool(value), None
+    return str(value), None
+
+
+def write_excel(df: pd.DataFrame, output, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """
+    Write a dataframe as xlsx with xlsxwriter in constant memory mode.
+
+    Rows are flushed to disk as they are written. Results longer than one sheet
+    continue on Sheet2, Sheet3 and so on.
+    """
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+    header_format = workbook.add_format(
+        {"bold": True, "border": 1, "align": "center", "valign": "top"}
+    )
+    datetime_format = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+    date_format = workbook.add_format({"num_format": "yyyy-mm-dd"})
+
+    worksheet = None
+    sheet_row = EXCEL_MAX_ROWS
+    for chunk in iter_chunks(df, chunk_rows) if len(df) > 0 else [df]:
+        for values in chunk.astype(object).itertuples(index=False, name=None):
+            if sheet_row == EXCEL_MAX_ROWS:
+                worksheet = workbook.add_worksheet()
+                worksheet.write_row(0, 0, list(df.columns), header_format)
+                sheet_row = 1
+            for col, value in enumerate(values):
+                value, cell_format = excel_cell(value, datetime_format, date_format)
+                if value is not None:
+                    worksheet.write(sheet_row, col, value, cell_format)
+            sheet_row += 1
+
+    if worksheet is None:
+        worksheet = workbook.add_worksheet()
+        worksheet.write_row(0, 0, list(df.columns), header_format)
+    workbook.close()
+
+
+def write_parquet(df: pd.DataFrame, output, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """
+    Write a dataframe as Parquet, one row group per chunk.
+
+    The schema is taken from the whole dataframe, so columns that are empty in
+    the first chunks keep the type of the later values.
+    """
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(output, schema) as writer:
+        for chunk in iter_chunks(df, chunk_rows):
+            writer.write_table(
+                pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            )
+
+
+def export_result(
+    df: pd.DataFrame, export_format: str, output, chunk_rows: int = EXPORT_CHUNK_ROWS
+):
+    """
+    Write a comparison result in one of EXPORT_FORMATS to a path or binary file.
+    """
+    writers = {"Excel": write_excel, "CSV": write_csv, "Parquet": write_parquet}
+    if export_format not in writers:
+        raise ValueError(f"Unknown export format {export_format}")
+    writers[export_format](df, output, chunk_rows)
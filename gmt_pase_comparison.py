@@ -1,30 +1,538 @@
+import argparse
+import importlib.util
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from itertools import repeat
 
 import numpy as np
 import pandas as pd
 
-# logging full config
-logging.basicConfig(
-    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+from data_cleaning.schema import expand_dtypes
+from instrumentation import (
+    add_instrumentation_events,
+    enable_instrumentation,
+    instrumentation_enabled,
+    instrumentation_events,
+    stage,
+    timed_stage,
 )
 
+# first Fecha included in the comparison
+FECHA_INICIO_COMPARACION = pd.to_datetime("2025-01-01")
+
+# execution backend of comparison(), polars runs polars_comparison.py
+COMPARISON_BACKEND = "pandas"
+COMPARISON_BACKENDS = ["pandas", "polars"]
+
+# columns of the comparison result, in output order
+RESULT_COLUMNS = [
+    "Viaje",
+    "Tag",
+    "No.Economico",
+    "Fecha",
+    "Hora",
+    "Caseta",
+    "Carril",
+    "Clase",
+    "Importe",
+    "Fecha Aplicacion",
+    "Hora Aplicacion",
+    "Consecar",
+    "Fecha y Hora de Salida",
+    "pase_datetime",
+    "Ruta",
+]
+
+# caseta rules, crossings at the caseta take the columns of the crossing `shift`
+# rows away of the same No.Economico (-1 is the next crossing). A new caseta rule
+# is one more entry, every rule runs once over all units.
+CASETA_RULES = [
+    {
+        "caseta": "LINCOLN",
+        "shift": -1,
+        "columns": ["Viaje", "Fecha y Hora de Salida"],
+    },
+]
+
+
+def sweep_trip_index(crossing_keys: np.ndarray, trip_keys: np.ndarray) -> np.ndarray:
+    """
+    Return for each crossing the position of the last trip starting at or before it.
 
-def comparison(viajes_unidad_df: pd.DataFrame, pase_df: pd.DataFrame) -> pd.DataFrame:
+    trip_keys must be sorted ascending, a trip owns the crossings from its own key
+    up to the key of the next trip. Crossings before the first trip get -1.
     """
-    Compare GM Transport and PASE dataframes and return the result.
+    return np.searchsorted(trip_keys, crossing_keys, side="right") - 1
+
+
+def viaje_dtype(viajes: pd.Series):
+    """
+    dtype of the Viaje result column for the GM Transport Viaje column viajes.
+
+    Integer Viajes become the nullable Int64, so crossings without Viaje are <NA>,
+    and float Viajes float64. Other Viajes, e.g. text trip ids, keep their dtype.
+    """
+    dtype = viajes.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return dtype.categories.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in "iu":
+        return pd.Int64Dtype()
+    if isinstance(dtype, np.dtype) and dtype.kind == "f":
+        return np.dtype("float64")
+    return dtype
+
+
+def timedelta_to_time(horas: pd.Series) -> pd.Series:
+    """
+    Convert a timedelta64 time of day column to datetime.time objects for output.
+    """
+    return (pd.Timestamp(0) + horas).dt.time
+
+
+@timed_stage("assignment")
+def assign_trips_by_hour(
+    pase_df: pd.DataFrame, hora_de_viajes: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Assign Viaje, fecha_salida_ma_min and Fecha y Hora de Salida to PASE crossings
+    on dates with more than one Viaje.
+
+    hora_de_viajes must be sorted by Fecha and hora_min. Each crossing gets the last
+    Viaje of its Fecha whose hora_min is not after the crossing Hora, crossings
+    before the first Viaje of the day are left as None.
+    """
+    trip_keys = (hora_de_viajes["Fecha"] + hora_de_viajes["hora_min"]).to_numpy()
+    crossing_keys = pase_df["pase_datetime"].to_numpy()
+
+    trip_index = sweep_trip_index(crossing_keys, trip_keys)
+    matched = (trip_index >= 0) & ~pd.isna(crossing_keys)
+    trip_index = np.where(matched, trip_index, 0)
+
+    # a Viaje can only be assigned to crossings of its own Fecha
+    trip_fechas = hora_de_viajes["Fecha"].to_numpy()[trip_index]
+    matched &= trip_fechas == pase_df["Fecha"].to_numpy()
+
+    for column in ["Viaje", "fecha_salida_ma_min", "Fecha y Hora de Salida"]:
+        values = hora_de_viajes[column].to_numpy(dtype=object)[trip_index]
+        pase_df[column] = np.where(matched, values, None)
+    return pase_df
+
+
+@timed_stage("assignment")
+def assign_trips_by_departure(
+    pase_df: pd.DataFrame, viajes_con_inicio_y_fin: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Complete missing Viaje values of PASE crossings using the Viaje start datetimes.
+
+    viajes_con_inicio_y_fin must be sorted by FechaInicio. A crossing without Viaje
+    gets the last Viaje started at or before its pase_datetime.
+    """
+    trip_keys = viajes_con_inicio_y_fin["FechaInicio"].to_numpy()
+    crossing_keys = pase_df["pase_datetime"].to_numpy()
+
+    trip_index = sweep_trip_index(crossing_keys, trip_keys)
+    matched = (
+        (trip_index >= 0) & pase_df["Viaje"].isna().to_numpy() & ~pd.isna(crossing_keys)
+    )
+    trip_index = np.where(matched, trip_index, 0)
+
+    if len(trip_keys) > 0:
+        values = viajes_con_inicio_y_fin["Viaje"].to_numpy(dtype=object)[trip_index]
+        pase_df["Viaje"] = np.where(matched, values, pase_df["Viaje"])
+    return pase_df
+
+
+def assign_unit_trips(
+    num_econimico: int,
+    target_viajes_unidad_df: pd.DataFrame,
+    target_pase_df: pd.DataFrame,
+) -> pd.DataFrame:
+    """
+    Assign GM Transport Viajes to the PASE crossings of a single No.Economico.
+
+    The result is sorted by Fecha and Hora with Viaje in the viaje_dtype of the
+    GM Transport Viajes, apply_business_rules completes it.
+    """
+    # * divide workflow if there are many deliveries
+    viajes_por_fecha = (
+        target_viajes_unidad_df.groupby(["Fecha"])["Viaje"]
+        .count()
+        .reset_index()
+        .rename(columns={"Viaje": "total_viajes", "Fecha": "fecha"})
+    )
+    logging.info(f"Cantidad de fechas con viajes : {len(viajes_por_fecha)}")
+
+    fechas_con_mas_de_un_viaje = viajes_por_fecha[viajes_por_fecha["total_viajes"] > 1]
+    logging.info(f"Fechas con mas de un viaje : {len(fechas_con_mas_de_un_viaje)}")
+    pase_viajes_multiples_por_fecha = pd.DataFrame()
+    if len(fechas_con_mas_de_un_viaje) > 0:
+        # copy-on-write: the slice is only copied when its columns are set
+        pase_viajes_multiples_por_fecha = target_pase_df[
+            target_pase_df["Fecha"].isin(fechas_con_mas_de_un_viaje["fecha"].values)
+        ].reset_index(drop=True)
+        pase_viajes_multiples_por_fecha["Viaje"] = None
+        pase_viajes_multiples_por_fecha["fecha_salida_ma_min"] = None
+        pase_viajes_multiples_por_fecha["Fecha y Hora de Salida"] = None
+
+    fechas_unicos = viajes_por_fecha[viajes_por_fecha["total_viajes"] == 1]
+    logging.info(f"Fechas con un solo viaje : {len(fechas_unicos)}")
+
+    pase_viajes_unicos_por_fecha = pd.DataFrame()
+    if len(fechas_unicos) > 0:
+        pase_viajes_unicos_por_fecha = target_pase_df[
+            target_pase_df["Fecha"].isin(fechas_unicos["fecha"].values)
+        ].reset_index(drop=True)
+
+        # * append GMT vlues to all PASE by Fecha
+        viajes_unidad_values = target_viajes_unidad_df.groupby(["Fecha"])["Viaje"].min()
+        viajes_unidad_values = viajes_unidad_values.reset_index().rename(
+            columns={"Viaje": "Viaje"}
+        )
+        pase_viajes_unicos_por_fecha = pase_viajes_unicos_por_fecha.merge(
+            viajes_unidad_values, on="Fecha", how="left"
+        )
+
+        # group by Viaje and get max Fecha y Hora de Salida
+        min_datetime_by_ship = target_viajes_unidad_df.groupby("Fecha").agg(
+            {"fecha_salida_ma_min": "max"}
+        )
+        max_datetime_by_ship = target_viajes_unidad_df.groupby("Fecha").agg(
+            {"Fecha y Hora de Salida": "max"}
+        )
+        # add column to original df
+        pase_viajes_unicos_por_fecha["fecha_salida_ma_min"] = (
+            pase_viajes_unicos_por_fecha["Fecha"].map(
+                min_datetime_by_ship["fecha_salida_ma_min"]
+            )
+        )
+        pase_viajes_unicos_por_fecha["Fecha y Hora de Salida"] = (
+            pase_viajes_unicos_por_fecha["Fecha"].map(
+                max_datetime_by_ship["Fecha y Hora de Salida"]
+            )
+        )
+
+    fechas_sin_viaje_asignado = target_pase_df[
+        ~target_pase_df["Fecha"].isin(viajes_por_fecha["fecha"].values)
+    ]
+    if len(fechas_sin_viaje_asignado) > 0:
+        logging.info(
+            f"Fechas sin viaje asignado (valores desde PASE) : {fechas_sin_viaje_asignado['Fecha'].nunique()}"
+        )
+
+    # * assign Viaje to PASE for fechas with more than one Viaje
+    if len(fechas_con_mas_de_un_viaje) > 0:
+        hora_de_viajes = target_viajes_unidad_df[
+            target_viajes_unidad_df["Fecha"].isin(
+                fechas_con_mas_de_un_viaje["fecha"].values
+            )
+        ]
+        hora_de_viajes = hora_de_viajes.groupby(
+            ["Fecha", "Viaje", "fecha_salida_ma_min", "Fecha y Hora de Salida"]
+        )["Hora Salida"].min()
+        hora_de_viajes = hora_de_viajes.reset_index().rename(
+            columns={"Hora Salida": "hora_min"}
+        )
+        # Viajes departing at the same time: the sweep assigns the highest Viaje
+        hora_de_viajes.sort_values(
+            by=["Fecha", "hora_min", "Viaje"], kind="stable", inplace=True
+        )
+        logging.info(
+            f"add Viaje to PASE for Fechas : amount of Viajes is {hora_de_viajes.shape[0]}"
+        )
+        pase_viajes_multiples_por_fecha = assign_trips_by_hour(
+            pase_viajes_multiples_por_fecha, hora_de_viajes
+        )
+        logging.info(f"Addition of Viaje values to PASE is completed")
+
+    # * Append PASE Results
+    pase_con_num_viaje = pd.DataFrame()
+
+    if len(pase_viajes_multiples_por_fecha) > 0:
+        pase_con_num_viaje = pase_viajes_multiples_por_fecha
+    if len(pase_viajes_unicos_por_fecha) > 0:
+        if pase_con_num_viaje.empty:
+            pase_con_num_viaje = pase_viajes_unicos_por_fecha
+        else:
+            pase_con_num_viaje = pd.concat(
+                [pase_con_num_viaje, pase_viajes_unicos_por_fecha]
+            )
+    if len(fechas_sin_viaje_asignado) > 0:
+        if pase_con_num_viaje.empty:
+            pase_con_num_viaje = fechas_sin_viaje_asignado
+        else:
+            pase_con_num_viaje = pd.concat(
+                [pase_con_num_viaje, fechas_sin_viaje_asignado]
+            )
+
+    # verify items amount
+    if len(pase_con_num_viaje) == len(target_pase_df):
+        logging.info(f"items comparison with PASE is correct: {len(target_pase_df)}")
+    else:
+        logging.error(
+            f"items comparison with PASE is incorrect: {len(pase_con_num_viaje)} vs {len(target_pase_df)}"
+        )
+
+    # sort values, crossings at the same time keep their PASE order
+    pase_con_num_viaje.sort_values(by=["Fecha", "Hora"], kind="stable", inplace=True)
+
+    # * Target Columns Verification
+    """ It applies in case that any trip number from GMT was assigned to PASE
+    Also, when pase_viajes_multiples_por_fecha and pase_viajes_unicos_por_fecha are empty
+    """
+    target_columns = [
+        "Viaje",
+        "fecha_salida_ma_min",
+        "Fecha y Hora de Salida",
+    ]
+    for column in target_columns:
+        if column not in pase_con_num_viaje.columns:
+            pase_con_num_viaje[column] = None
+            logging.warning(f"Any trip was assigned to PASE. Column {column} is None")
+
+    """ start datetime verification """
+    # * Convert columns to datetime
+    # GMT datetime of the assigned Viaje, pase_datetime is created by clean_pase_data
+    gmt_datetime = pd.to_datetime(pase_con_num_viaje["Fecha y Hora de Salida"])
+
+    # * Comparison rules
+    # verify if pase datetime is smaller than GMT datetime
+    pase_vs_gmt = (pase_con_num_viaje["pase_datetime"] < gmt_datetime).to_numpy()
+
+    # * Apply comparison rules
+    # remove Viaje and Fecha y Hora de Salida values if pase datetime is smaller
+    # than GMT datetime, the columns are updated in place
+    pase_con_num_viaje["Viaje"] = pase_con_num_viaje["Viaje"].astype(object)
+    pase_con_num_viaje.loc[pase_vs_gmt, "Viaje"] = None
+    pase_con_num_viaje["Fecha y Hora de Salida"] = gmt_datetime
+    pase_con_num_viaje.loc[pase_vs_gmt, "Fecha y Hora de Salida"] = pd.NaT
+
+    #! Complete Viaje values for PASE based on Viajes Unidad Fecha
+    viajes_con_inicio_y_fin = target_viajes_unidad_df.groupby(["Viaje"])[
+        "Fecha y Hora de Salida"
+    ].min()
+    viajes_con_inicio_y_fin = viajes_con_inicio_y_fin.reset_index().rename(
+        columns={"Fecha y Hora de Salida": "FechaInicio"}
+    )
+    # Viajes starting at the same time: the sweep assigns the highest Viaje
+    viajes_con_inicio_y_fin.sort_values(
+        by=["FechaInicio", "Viaje"], kind="stable", inplace=True
+    )
+    pase_con_num_viaje = assign_trips_by_departure(
+        pase_con_num_viaje, viajes_con_inicio_y_fin
+    )
+
+    # Viaje in the dtype of the GM Transport Viajes, missing for crossings without it
+    pase_con_num_viaje["Viaje"] = pase_con_num_viaje["Viaje"].astype(
+        viaje_dtype(target_viajes_unidad_df["Viaje"])
+    )
+    return pase_con_num_viaje
+
+
+@timed_stage("caseta_rules")
+def apply_caseta_rules(
+    pase_con_num_viaje: pd.DataFrame, rules: list = CASETA_RULES
+) -> pd.DataFrame:
+    """
+    Apply CASETA_RULES to the assigned crossings of every No.Economico.
+
+    The crossings of each No.Economico must be contiguous, as comparison
+    concatenates them. Each rule shifts its columns over all the crossings once and
+    updates the rows of its caseta in place; rows shifted from another unit are
+    left empty, as a shift inside every unit would.
+    """
+    unidades = pase_con_num_viaje["No.Economico"]
+    for rule in rules:
+        es_caseta = (pase_con_num_viaje["Caseta"] == rule["caseta"]).to_numpy()
+        if not es_caseta.any():
+            continue
+        misma_unidad = (unidades.shift(rule["shift"]) == unidades).to_numpy()
+        desde_unidad = es_caseta & misma_unidad
+        for column in rule["columns"]:
+            desplazados = pase_con_num_viaje[column].shift(rule["shift"]).to_numpy()
+            pase_con_num_viaje.loc[desde_unidad, column] = desplazados[desde_unidad]
+            pase_con_num_viaje.loc[es_caseta & ~misma_unidad, column] = None
+    return pase_con_num_viaje
+
+
+@timed_stage("ruta_merge")
+def append_rutas(
+    pase_con_num_viaje: pd.DataFrame, viajes_unidad_df: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Append the GM Transport Ruta of the assigned Viaje and departure.
+    """
+    # remove duplicates
+    gmt_data_to_append = viajes_unidad_df[
+        ["No.Economico", "Viaje", "Ruta", "Fecha y Hora de Salida"]
+    ].drop_duplicates()
+
+    return pase_con_num_viaje.merge(
+        gmt_data_to_append,
+        on=["No.Economico", "Fecha y Hora de Salida", "Viaje"],
+        how="left",
+    )
+
+
+def velox_labels(num_economicos: pd.Series) -> pd.Series:
+    # add VELOX to No.Economico if it begins with 2, once per distinct No.Economico
+    etiquetas = {
+        numero: f"VELOX {numero}" if str(numero).startswith("2") else str(numero)
+        for numero in num_economicos.unique()
+    }
+    return num_economicos.map(etiquetas)
+
+
+@timed_stage("business_rules")
+def apply_business_rules(
+    pase_con_num_viaje: pd.DataFrame,
+    viajes_unidad_df: pd.DataFrame,
+    fecha_salida_inicial: pd.Timestamp = None,
+    rules: list = CASETA_RULES,
+) -> pd.DataFrame:
+    """
+    Complete the crossings of assign_unit_trips for any amount of No.Economico.
+
+    Caseta rules, the fill of Fecha y Hora de Salida, the Ruta merge and the VELOX
+    label run once over all the crossings, shifts and fills grouped by
+    No.Economico. fecha_salida_inicial is the Fecha y Hora de Salida carried from
+    earlier crossings, used when only the latest dates of one No.Economico are
+    compared again.
+    """
+    rows = len(pase_con_num_viaje)
+    pase_con_num_viaje = pase_con_num_viaje.reset_index(drop=True)
+
+    # * Shift Viaje values of caseta rules, e.g. LINCOLN
+    pase_con_num_viaje = apply_caseta_rules(pase_con_num_viaje, rules)
+
+    # * Complete fecha_salida based on previous value of the same No.Economico
+    pase_con_num_viaje["Fecha y Hora de Salida"] = pase_con_num_viaje.groupby(
+        "No.Economico", sort=False
+    )["Fecha y Hora de Salida"].ffill()
+    if fecha_salida_inicial is not None:
+        pase_con_num_viaje["Fecha y Hora de Salida"] = pase_con_num_viaje[
+            "Fecha y Hora de Salida"
+        ].fillna(fecha_salida_inicial)
+
+    # * Append GMT Rutas to PASE
+    pase_con_num_viaje = append_rutas(pase_con_num_viaje, viajes_unidad_df)
+
+    # * add VELOX to No.Economico, if it begins with 2
+    pase_con_num_viaje["No.Economico"] = velox_labels(
+        pase_con_num_viaje["No.Economico"]
+    )
+
+    # reorder and remove columns, compact dtypes of the cleaning are not returned
+    pase_con_num_viaje = expand_dtypes(pase_con_num_viaje[RESULT_COLUMNS])
+
+    # * convert Hora columns from timedelta to time objects for output
+    pase_con_num_viaje["Hora"] = timedelta_to_time(pase_con_num_viaje["Hora"])
+    pase_con_num_viaje["Hora Aplicacion"] = timedelta_to_time(
+        pase_con_num_viaje["Hora Aplicacion"]
+    )
+
+    # verify items amount
+    if len(pase_con_num_viaje) == rows:
+        logging.info(f"GMT items comparison with PASE is correct: {rows}")
+    else:
+        logging.error(
+            f"GMT items comparison with PASE is incorrect: {len(pase_con_num_viaje)} vs {rows}"
+        )
+    return pase_con_num_viaje
+
+
+def compare_unit(
+    num_econimico: int,
+    target_viajes_unidad_df: pd.DataFrame,
+    target_pase_df: pd.DataFrame,
+    fecha_salida_inicial: pd.Timestamp = None,
+) -> pd.DataFrame:
+    """
+    Assign GM Transport Viajes to the PASE crossings of a single No.Economico and
+    apply the business rules.
+
+    fecha_salida_inicial is the Fecha y Hora de Salida carried from crossings
+    before target_pase_df, used when only the latest dates are compared again.
+    """
+    pase_con_num_viaje = assign_unit_trips(
+        num_econimico, target_viajes_unidad_df, target_pase_df
+    )
+    pase_con_num_viaje = apply_business_rules(
+        pase_con_num_viaje, target_viajes_unidad_df, fecha_salida_inicial
+    )
+    logging.info(
+        f"Addition of GMT values to PASE is completed for no economico: {num_econimico}"
+    )
+    return pase_con_num_viaje
+
+
+def timed_assign_unit_trips(
+    num_econimico: int,
+    target_viajes_unidad_df: pd.DataFrame,
+    target_pase_df: pd.DataFrame,
+) -> pd.DataFrame:
+    """
+    assign_unit_trips recorded as the per unit compare_unit instrumentation stage.
+    """
+    with stage(
+        "compare_unit", unit=int(num_econimico), rows_in=len(target_pase_df)
+    ) as record:
+        pase_con_num_viaje = assign_unit_trips(
+            num_econimico, target_viajes_unidad_df, target_pase_df
+        )
+        record["rows_out"] = len(pase_con_num_viaje)
+    return pase_con_num_viaje
+
+
+def assign_unit_trips_worker(
+    num_econimico: int,
+    target_viajes_unidad_df: pd.DataFrame,
+    target_pase_df: pd.DataFrame,
+    instrumented: bool,
+) -> tuple[pd.DataFrame, list]:
+    """
+    Run timed_assign_unit_trips in a worker process.
+
+    Returns the result and the instrumentation records of the worker, which are
+    merged into the records of the parent process.
     """
+    if instrumented:
+        enable_instrumentation()
+    pase_con_num_viaje = timed_assign_unit_trips(
+        num_econimico, target_viajes_unidad_df, target_pase_df
+    )
+    return pase_con_num_viaje, instrumentation_events()
+
+
+def partition_by_unit(df: pd.DataFrame) -> dict:
+    """
+    Split a dataframe by No.Economico, keeping the original row order of each unit.
+
+    Rows are grouped once, so the cost does not grow with the amount of units.
+    """
+    return {
+        num_economico: unit_df
+        for num_economico, unit_df in df.groupby("No.Economico", sort=False)
+    }
+
 
+def prepare_comparison_data(
+    viajes_unidad_df: pd.DataFrame, pase_df: pd.DataFrame
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Filter cleaned GM Transport and PASE dataframes to the comparison window.
+    """
     # * read GM Transport from db folder
     # viajes_unidad_df = pd.read_csv("db/gmt_viajes_por_unidad.csv")
-    viajes_unidad_df.rename(columns={"Fecha Salida": "Fecha"}, inplace=True)
+    viajes_unidad_df = viajes_unidad_df.rename(columns={"Fecha Salida": "Fecha"})
     logging.info(
         f"GM Transport data : rows {viajes_unidad_df.shape[0]} columns {viajes_unidad_df.shape[1]}"
     )
 
     # Fecha bigger than 2025-01-01
-    datetime_parameter = "2025-01-01"
-    datetime_parameter = pd.to_datetime(datetime_parameter)
+    datetime_parameter = FECHA_INICIO_COMPARACION
     viajes_unidad_df = viajes_unidad_df[viajes_unidad_df["Fecha"] >= datetime_parameter]
     logging.info(
         f'Min Date : {viajes_unidad_df["Fecha"].min()} Max Date : {viajes_unidad_df["Fecha"].max()}'
@@ -64,39 +572,50 @@ def comparison(viajes_unidad_df: pd.DataFrame, pase_df: pd.DataFrame) -> pd.Data
         "Fecha Aplicacion",
         "Hora Aplicacion",
         "Consecar",
+        "pase_datetime",
     ]
     pase_df = pase_df[columns]
     logging.info(f"PASE data : rows {pase_df.shape[0]} columns {pase_df.shape[1]}")
 
     # * verify columns types
-    logging.info(f"GM Transport data types : {viajes_unidad_df.dtypes}")
-    logging.info(f"PASE data types : {pase_df.dtypes}")
+    logging.debug(f"GM Transport data types : {viajes_unidad_df.dtypes.to_dict()}")
+    logging.debug(f"PASE data types : {pase_df.dtypes.to_dict()}")
 
-    # verify Num.Economico dtype is int
-    if viajes_unidad_df["No.Economico"].dtype != "int64":
+    # verify Num.Economico dtype is int, downcasted int types are kept
+    if not pd.api.types.is_integer_dtype(viajes_unidad_df["No.Economico"]):
         viajes_unidad_df["No.Economico"] = viajes_unidad_df["No.Economico"].astype(int)
         logging.info(f"Num.Economico dtype is converted to int")
-    if pase_df["No.Economico"].dtype != "int64":
+    if not pd.api.types.is_integer_dtype(pase_df["No.Economico"]):
         pase_df["No.Economico"] = pase_df["No.Economico"].astype(int)
         logging.info(f"Num.Economico dtype is converted to int")
 
+    return viajes_unidad_df, pase_df
+
+
+def iter_unit_partitions(viajes_unidad_df: pd.DataFrame, pase_df: pd.DataFrame):
+    """
+    Yield (No.Economico, GM Transport rows, PASE rows) for every unit with PASE data.
+
+    Expects the dataframes returned by prepare_comparison_data.
+    """
     # * get unique No.Economico values
     num_economicos = viajes_unidad_df["No.Economico"].unique()
     # num_economicos = [2402]
-    logging.info(f"No Economico values : {num_economicos}")
+    logging.debug(f"No Economico values : {num_economicos}")
     logging.info(f"Amount of No Economico values : {len(num_economicos)}")
 
-    records_df = pd.DataFrame()  # collect all dataframes for each No.Economico
+    # * split both dataframes by No.Economico in a single pass
+    viajes_por_unidad = partition_by_unit(viajes_unidad_df)
+    pase_por_unidad = partition_by_unit(pase_df)
+
     for num_econimico in num_economicos:
         # * filter by No.Economico
-        target_viajes_unidad_df = viajes_unidad_df[
-            viajes_unidad_df["No.Economico"] == num_econimico
-        ]
+        target_viajes_unidad_df = viajes_por_unidad[num_econimico]
         logging.info(
             f"GM Transport data : rows {target_viajes_unidad_df.shape[0]} columns {target_viajes_unidad_df.shape[1]} for No.Economico {num_econimico}"
         )
 
-        target_pase_df = pase_df[pase_df["No.Economico"] == num_econimico]
+        target_pase_df = pase_por_unidad.get(num_econimico, pase_df.iloc[0:0])
         logging.info(
             f"PASE filtered data : rows {target_pase_df.shape[0]} columns {target_pase_df.shape[1]} for No.Economico {num_econimico}"
         )
@@ -106,437 +625,173 @@ def comparison(viajes_unidad_df: pd.DataFrame, pase_df: pd.DataFrame) -> pd.Data
             )
             continue
 
-        # * divide workflow if there are many deliveries
-        viajes_por_fecha = (
-            target_viajes_unidad_df.groupby(["Fecha"])["Viaje"]
-            .count()
-            .reset_index()
-            .rename(columns={"Viaje": "total_viajes", "Fecha": "fecha"})
-        )
-        logging.info(f"Cantidad de fechas con viajes : {len(viajes_por_fecha)}")
-
-        fechas_con_mas_de_un_viaje = viajes_por_fecha[
-            viajes_por_fecha["total_viajes"] > 1
-        ]
-        logging.info(f"Fechas con mas de un viaje : {len(fechas_con_mas_de_un_viaje)}")
-        pase_viajes_multiples_por_fecha = pd.DataFrame()
-        if len(fechas_con_mas_de_un_viaje) > 0:
-            pase_viajes_multiples_por_fecha = target_pase_df[
-                target_pase_df["Fecha"].isin(fechas_con_mas_de_un_viaje["fecha"].values)
-            ].copy()
-            pase_viajes_multiples_por_fecha.reset_index(drop=True, inplace=True)
-            pase_viajes_multiples_por_fecha["Viaje"] = None
-            pase_viajes_multiples_por_fecha["fecha_salida_ma_min"] = None
-            pase_viajes_multiples_por_fecha["Fecha y Hora de Salida"] = None
-
-        fechas_unicos = viajes_por_fecha[viajes_por_fecha["total_viajes"] == 1]
-        logging.info(f"Fechas con un solo viaje : {len(fechas_unicos)}")
-
-        pase_viajes_unicos_por_fecha = pd.DataFrame()
-        if len(fechas_unicos) > 0:
-            pase_viajes_unicos_por_fecha = target_pase_df[
-                target_pase_df["Fecha"].isin(fechas_unicos["fecha"].values)
-            ].copy()
-            pase_viajes_unicos_por_fecha.reset_index(drop=True, inplace=True)
-
-            # * append GMT vlues to all PASE by Fecha
-            viajes_unidad_values = target_viajes_unidad_df.groupby(["Fecha"])[
-                "Viaje"
-            ].min()
-            viajes_unidad_values = viajes_unidad_values.reset_index().rename(
-                columns={"Viaje": "Viaje"}
-            )
-            pase_viajes_unicos_por_fecha = pase_viajes_unicos_por_fecha.merge(
-                viajes_unidad_values, on="Fecha", how="left"
-            )
-
-            # group by Viaje and get max Fecha y Hora de Salida
-            min_datetime_by_ship = target_viajes_unidad_df.groupby("Fecha").agg(
-                {"fecha_salida_ma_min": "max"}
-            )
-            max_datetime_by_ship = target_viajes_unidad_df.groupby("Fecha").agg(
-                {"Fecha y Hora de Salida": "max"}
-            )
-            # add column to original df
-            pase_viajes_unicos_por_fecha["fecha_salida_ma_min"] = (
-                pase_viajes_unicos_por_fecha["Fecha"].map(
-                    min_datetime_by_ship["fecha_salida_ma_min"]
-                )
-            )
-            pase_viajes_unicos_por_fecha["Fecha y Hora de Salida"] = (
-                pase_viajes_unicos_por_fecha["Fecha"].map(
-                    max_datetime_by_ship["Fecha y Hora de Salida"]
-                )
-            )
-
-        fechas_sin_viaje_asignado = target_pase_df[
-            ~target_pase_df["Fecha"].isin(viajes_por_fecha["fecha"].values)
-        ]
-        if len(fechas_sin_viaje_asignado) > 0:
-            logging.info(
-                f"Fechas sin viaje asignado (valores desde PASE) : {fechas_sin_viaje_asignado['Fecha'].nunique()}"
-            )
+        yield num_econimico, target_viajes_unidad_df, target_pase_df
 
-        # * assign Viaje to PASE for fechas with more than one Viaje
-        if len(fechas_con_mas_de_un_viaje) > 0:
-            hora_de_viajes = target_viajes_unidad_df[
-                target_viajes_unidad_df["Fecha"].isin(
-                    fechas_con_mas_de_un_viaje["fecha"].values
-                )
-            ].copy()
-            hora_de_viajes = hora_de_viajes.groupby(
-                ["Fecha", "Viaje", "fecha_salida_ma_min", "Fecha y Hora de Salida"]
-            )["Hora Salida"].min()
-            hora_de_viajes = hora_de_viajes.reset_index().rename(
-                columns={"Hora Salida": "hora_min"}
-            )
-            hora_de_viajes.sort_values(
-                by=["Fecha", "hora_min"], ascending=[True, True], inplace=True
-            )
 
-            # format hora_min as time object
-            hora_de_viajes["hora_min"] = pd.to_datetime(
-                hora_de_viajes["hora_min"], format="%H:%M:%S"
-            ).dt.time
+def collect_worker_events(resultados):
+    # Add the stage records of every worker result to the current run
+    for pase_con_num_viaje, events in resultados:
+        add_instrumentation_events(events)
+        yield pase_con_num_viaje
 
-            hora_de_viajes["hora_max"] = hora_de_viajes["hora_min"].shift(-1)
 
-            # add rank for Viaje by Fecha
-            hora_de_viajes["fecha_rank"] = (
-                hora_de_viajes.groupby("Fecha")["Viaje"].cumcount() + 1
-            )
-            hora_de_viajes["total_viajes"] = hora_de_viajes.groupby("Fecha")[
-                "Viaje"
-            ].transform("count")
-
-            # remove last hour value of each date
-            conditions = [
-                hora_de_viajes["fecha_rank"] == hora_de_viajes["total_viajes"]
-            ]
-            choices = [None]
-            hora_de_viajes["hora_max"] = np.select(
-                conditions, choices, default=hora_de_viajes["hora_max"]
-            )
-
-            for fecha in fechas_con_mas_de_un_viaje["fecha"].values:
-                target_horas_fecha = hora_de_viajes[hora_de_viajes["Fecha"] == fecha]
-                logging.info(
-                    f"add Viaje to PASE for Fecha : amount of Viajes is {target_horas_fecha.shape[0]}"
-                )
-
-                for row_index, row in target_horas_fecha.iterrows():
-                    if row["hora_max"] != None:
-                        conditions = [
-                            (pase_viajes_multiples_por_fecha["Hora"] >= row["hora_min"])
-                            & (
-                                pase_viajes_multiples_por_fecha["Hora"]
-                                < row["hora_max"]
-                            )
-                            & (pase_viajes_multiples_por_fecha["Fecha"] == row["Fecha"])
-                        ]
-                        choices = [row["Viaje"]]
-                        pase_viajes_multiples_por_fecha["Viaje"] = np.select(
-                            conditions,
-                            choices,
-                            default=pase_viajes_multiples_por_fecha["Viaje"],
-                        )
-                        choices = [row["fecha_salida_ma_min"]]
-                        pase_viajes_multiples_por_fecha["fecha_salida_ma_min"] = (
-                            np.select(
-                                conditions,
-                                choices,
-                                default=pase_viajes_multiples_por_fecha[
-                                    "fecha_salida_ma_min"
-                                ],
-                            )
-                        )
-                        choices = [row["Fecha y Hora de Salida"]]
-                        pase_viajes_multiples_por_fecha["Fecha y Hora de Salida"] = (
-                            np.select(
-                                conditions,
-                                choices,
-                                default=pase_viajes_multiples_por_fecha[
-                                    "Fecha y Hora de Salida"
-                                ],
-                            )
-                        )
-
-                    else:
-                        conditions = [
-                            (pase_viajes_multiples_por_fecha["Hora"] >= row["hora_min"])
-                            & (pase_viajes_multiples_por_fecha["Fecha"] == row["Fecha"])
-                        ]
-                        choices = [row["Viaje"]]
-                        pase_viajes_multiples_por_fecha["Viaje"] = np.select(
-                            conditions,
-                            choices,
-                            default=pase_viajes_multiples_por_fecha["Viaje"],
-                        )
-                        choices = [row["fecha_salida_ma_min"]]
-                        pase_viajes_multiples_por_fecha["fecha_salida_ma_min"] = (
-                            np.select(
-                                conditions,
-                                choices,
-                                default=pase_viajes_multiples_por_fecha[
-                                    "fecha_salida_ma_min"
-                                ],
-                            )
-                        )
-                        choices = [row["Fecha y Hora de Salida"]]
-                        pase_viajes_multiples_por_fecha["Fecha y Hora de Salida"] = (
-                            np.select(
-                                conditions,
-                                choices,
-                                default=pase_viajes_multiples_por_fecha[
-                                    "Fecha y Hora de Salida"
-                                ],
-                            )
-                        )
-            logging.info(f"Addition of Viaje values to PASE is completed")
-
-        # * Append PASE Results
-        pase_con_num_viaje = pd.DataFrame()
-
-        if len(pase_viajes_multiples_por_fecha) > 0:
-            pase_con_num_viaje = pase_viajes_multiples_por_fecha
-        if len(pase_viajes_unicos_por_fecha) > 0:
-            if pase_con_num_viaje.empty:
-                pase_con_num_viaje = pase_viajes_unicos_por_fecha
-            else:
-                pase_con_num_viaje = pd.concat(
-                    [pase_con_num_viaje, pase_viajes_unicos_por_fecha]
-                )
-        if len(fechas_sin_viaje_asignado) > 0:
-            if pase_con_num_viaje.empty:
-                pase_con_num_viaje = fechas_sin_viaje_asignado
-            else:
-                pase_con_num_viaje = pd.concat(
-                    [pase_con_num_viaje, fechas_sin_viaje_asignado]
-                )
-
-        # verify items amount
-        if len(pase_con_num_viaje) == len(target_pase_df):
-            logging.info(
-                f"items comparison with PASE is correct: {len(target_pase_df)}"
-            )
-        else:
-            logging.error(
-                f"items comparison with PASE is incorrect: {len(pase_con_num_viaje)} vs {len(target_pase_df)}"
+def iter_unit_assignments(
+    viajes_unidad_df: pd.DataFrame,
+    pase_df: pd.DataFrame,
+    workers: int = 1,
+    progress=None,
+):
+    """
+    Assign GM Transport Viajes to PASE crossings one No.Economico at a time.
+
+    Expects the dataframes returned by prepare_comparison_data and yields
+    (No.Economico, GM Transport rows of the unit, assigned dataframe) tuples.
+    The assigned dataframes have no business rules yet, use iter_comparison for
+    complete results per unit.
+    With workers > 1 the units are assigned in a process pool; each worker only
+    receives the GM Transport and PASE rows of its own units, and results are
+    yielded in the same order as the serial execution.
+    progress is called as progress(units_done, units_total, No.Economico) after
+    every unit, an exception raised by it stops the comparison.
+    """
+    # * collect the GM Transport and PASE rows of each No.Economico
+    unidades, viajes_por_tarea, pase_por_tarea = [], [], []
+    for num_econimico, target_viajes_unidad_df, target_pase_df in iter_unit_partitions(
+        viajes_unidad_df, pase_df
+    ):
+        unidades.append(num_econimico)
+        viajes_por_tarea.append(target_viajes_unidad_df)
+        pase_por_tarea.append(target_pase_df)
+
+    # * compare every No.Economico, serial or sharded across a process pool
+    executor = None
+    if workers > 1 and len(unidades) > 1:
+        logging.info(f"Comparing {len(unidades)} No.Economico with {workers} workers")
+        chunksize = max(1, len(unidades) // (workers * 4))
+        executor = ProcessPoolExecutor(max_workers=workers)
+        resultados = collect_worker_events(
+            executor.map(
+                assign_unit_trips_worker,
+                unidades,
+                viajes_por_tarea,
+                pase_por_tarea,
+                repeat(instrumentation_enabled()),
+                chunksize=chunksize,
             )
-
-        # sort values
-        pase_con_num_viaje.sort_values(
-            by=["Fecha", "Hora"], ascending=[True, True], inplace=True
-        )
-
-        # * Target Columns Verification
-        """ It applies in case that any trip number from GMT was assigned to PASE
-        Also, when pase_viajes_multiples_por_fecha and pase_viajes_unicos_por_fecha are empty
-        """
-        target_columns = [
-            "Viaje",
-            "fecha_salida_ma_min",
-            "Fecha y Hora de Salida",
-        ]
-        for column in target_columns:
-            if column not in pase_con_num_viaje.columns:
-                pase_con_num_viaje[column] = None
-                logging.warning(
-                    f"Any trip was assigned to PASE. Column {column} is None"
-                )
-
-        """ start datetime verification """
-        # * Convert columns to datetime
-        # create GMT datetime column for fecha_salida_ma_min
-        pase_con_num_viaje["gmt_datetime"] = pd.to_datetime(
-            pase_con_num_viaje["Fecha y Hora de Salida"]
         )
-        # create pase datetime  column
-        # pase_con_num_viaje["pase_datetime"] = pd.to_datetime(
-        #    pase_con_num_viaje["Fecha"] + " " + pase_con_num_viaje["Hora"]
-        # )
-        # concat Timestamp' and 'datetime.time' objects
-        pase_con_num_viaje["pase_datetime"] = pd.to_datetime(
-            pase_con_num_viaje["Fecha"].astype(str)
-            + " "
-            + pase_con_num_viaje["Hora"].astype(str)
+    else:
+        resultados = map(
+            timed_assign_unit_trips, unidades, viajes_por_tarea, pase_por_tarea
         )
 
-        # * Comparison rules
-        # verify if pase datetime is smaller than GMT datetime
-        pase_con_num_viaje["pase_vs_gmt"] = (
-            pase_con_num_viaje["pase_datetime"] < pase_con_num_viaje["gmt_datetime"]
-        )
-
-        # * Apply comparison rules
-        # remove viaje values if pase datetime is smaller than GMT datetime
-        pase_con_num_viaje["Viaje"] = np.where(
-            pase_con_num_viaje["pase_vs_gmt"] == True,
-            None,
-            pase_con_num_viaje["Viaje"],
-        )
-        # remove Fecha y Hora de Salida values if pase datetime is smaller than GMT datetime
-        pase_con_num_viaje["Fecha y Hora de Salida"] = np.where(
-            pase_con_num_viaje["pase_vs_gmt"] == True,
-            None,
-            pase_con_num_viaje["Fecha y Hora de Salida"],
-        )
+    try:
+        for i, (num_econimico, pase_con_num_viaje) in enumerate(
+            zip(unidades, resultados)
+        ):
+            if progress is not None:
+                progress(i + 1, len(unidades), num_econimico)
+            yield num_econimico, viajes_por_tarea[i], pase_con_num_viaje
+    finally:
+        # pending units are not compared when the comparison stops early
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def iter_comparison(
+    viajes_unidad_df: pd.DataFrame,
+    pase_df: pd.DataFrame,
+    workers: int = 1,
+    progress=None,
+):
+    """
+    Compare GM Transport and PASE one No.Economico at a time.
 
-        # convert to datetime
-        pase_con_num_viaje["Fecha y Hora de Salida"] = pd.to_datetime(
-            pase_con_num_viaje["Fecha y Hora de Salida"]
+    Expects the dataframes returned by prepare_comparison_data and yields
+    (No.Economico, result dataframe) tuples with the business rules applied, so
+    every unit can be written as soon as it is compared. The rows are those of
+    comparison(), which applies the rules once over all units instead.
+    workers and progress work as in iter_unit_assignments.
+    """
+    for (
+        num_econimico,
+        target_viajes_unidad_df,
+        pase_con_num_viaje,
+    ) in iter_unit_assignments(
+        viajes_unidad_df, pase_df, workers=workers, progress=progress
+    ):
+        yield num_econimico, apply_business_rules(
+            pase_con_num_viaje, target_viajes_unidad_df
         )
 
-        #! Complete Viaje values for PASE based on Viajes Unidad Fecha
-        viajes_con_inicio_y_fin = target_viajes_unidad_df.groupby(["Viaje"])[
-            "Fecha y Hora de Salida"
-        ].min()
-        viajes_con_inicio_y_fin = viajes_con_inicio_y_fin.reset_index().rename(
-            columns={"Fecha y Hora de Salida": "FechaInicio"}
-        )
-        viajes_con_inicio_y_fin.sort_values(
-            by=["FechaInicio"], ascending=[True], inplace=True
-        )
-        viajes_con_inicio_y_fin["FechaFin"] = viajes_con_inicio_y_fin[
-            "FechaInicio"
-        ].shift(-1)
-
-        for viaje_index, viaje_row in viajes_con_inicio_y_fin.iterrows():
-            if viaje_row["FechaFin"] == None or pd.isna(viaje_row["FechaFin"]) == True:
-                conditions = [
-                    (pase_con_num_viaje["pase_datetime"] >= viaje_row["FechaInicio"])
-                    & (pase_con_num_viaje["Viaje"].isna())
-                ]
-                choices = [viaje_row["Viaje"]]
-                pase_con_num_viaje["Viaje"] = np.select(
-                    conditions, choices, default=pase_con_num_viaje["Viaje"]
-                )
-            else:
-                conditions = [
-                    (pase_con_num_viaje["pase_datetime"] >= viaje_row["FechaInicio"])
-                    & (pase_con_num_viaje["pase_datetime"] < viaje_row["FechaFin"])
-                    & (pase_con_num_viaje["Viaje"].isna())
-                ]
-                choices = [viaje_row["Viaje"]]
-                pase_con_num_viaje["Viaje"] = np.select(
-                    conditions, choices, default=pase_con_num_viaje["Viaje"]
-                )
-
-        # * Shift viaje value if nombre de caseta is "LINCOLN" ############ Only for LINCOLN ############
-        pase_con_num_viaje["viaje_shift"] = pase_con_num_viaje["Viaje"].shift(-1)
-        conditions = [pase_con_num_viaje["Caseta"] == "LINCOLN"]
-        choices = [pase_con_num_viaje["viaje_shift"]]
-        pase_con_num_viaje["Viaje"] = np.select(
-            conditions, choices, default=pase_con_num_viaje["Viaje"]
-        )
-        pase_con_num_viaje.drop(columns=["viaje_shift"], inplace=True)
 
-        pase_con_num_viaje["fecha_salida_ma_min_shift"] = pase_con_num_viaje[
-            "Fecha y Hora de Salida"
-        ].shift(-1)
-        conditions = [pase_con_num_viaje["Caseta"] == "LINCOLN"]
-        choices = [pase_con_num_viaje["fecha_salida_ma_min_shift"]]
-        pase_con_num_viaje["Fecha y Hora de Salida"] = np.select(
-            conditions, choices, default=pase_con_num_viaje["Fecha y Hora de Salida"]
+def pandas_comparison(
+    viajes_unidad_df: pd.DataFrame,
+    pase_df: pd.DataFrame,
+    workers: int = 1,
+    progress=None,
+) -> pd.DataFrame:
+    """
+    Compare the dataframes returned by prepare_comparison_data one No.Economico
+    at a time, see iter_unit_assignments.
+    """
+    # * collect the assigned crossings of each No.Economico and concatenate them once
+    records = []
+    for num_econimico, _, pase_con_num_viaje in iter_unit_assignments(
+        viajes_unidad_df, pase_df, workers=workers, progress=progress
+    ):
+        records.append(pase_con_num_viaje)
+        logging.info(
+            f"current records : units {len(records)} rows {pase_con_num_viaje.shape[0]} for No.Economico {num_econimico}"
         )
-        pase_con_num_viaje.drop(columns=["fecha_salida_ma_min_shift"], inplace=True)
 
-        # * Complete fecha_salida based on previous value
-        pase_con_num_viaje["fecha_salida_fill"] = pase_con_num_viaje[
-            "Fecha y Hora de Salida"
-        ].ffill()
+    # * business rules over all units in one pass
+    if len(records) == 0:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    return apply_business_rules(pd.concat(records, ignore_index=True), viajes_unidad_df)
 
-        pase_con_num_viaje["Fecha y Hora de Salida"] = pase_con_num_viaje[
-            "fecha_salida_fill"
-        ]
-        pase_con_num_viaje.drop(columns=["fecha_salida_fill"], inplace=True)
-
-        # * Append GMT Rutas to PASE
-        gmt_data_to_append = target_viajes_unidad_df[
-            ["Viaje", "Ruta", "Fecha y Hora de Salida"]
-        ].copy()
-
-        # remove duplicates
-        gmt_data_to_append.drop_duplicates(inplace=True)
 
-        # convert to datetime
-        pase_con_num_viaje["Fecha y Hora de Salida"] = pd.to_datetime(
-            pase_con_num_viaje["Fecha y Hora de Salida"]
-        )
+def available_backends() -> list:
+    # Backends of comparison() whose libraries are installed
+    return [
+        backend
+        for backend in COMPARISON_BACKENDS
+        if backend == "pandas" or importlib.util.find_spec(backend) is not None
+    ]
 
-        pase_con_num_viaje = pase_con_num_viaje.merge(
-            gmt_data_to_append,
-            on=["Fecha y Hora de Salida", "Viaje"],
-            how="left",
-            indicator=True,
-        )
 
-        # * add VELOX to No.Economico, if it begins with 2
-        pase_con_num_viaje["No.Economico"] = pase_con_num_viaje["No.Economico"].astype(
-            str
-        )
-        pase_con_num_viaje["No.Economico"] = np.where(
-            pase_con_num_viaje["No.Economico"].astype(str).str.startswith("2"),
-            "VELOX " + pase_con_num_viaje["No.Economico"].astype(str),
-            pase_con_num_viaje["No.Economico"],
-        )
+@timed_stage("comparison")
+def comparison(
+    viajes_unidad_df: pd.DataFrame,
+    pase_df: pd.DataFrame,
+    workers: int = 1,
+    progress=None,
+    backend: str = None,
+) -> pd.DataFrame:
+    """
+    Compare GM Transport and PASE dataframes and return the result.
 
-        # remove columns
-        pase_con_num_viaje.drop(
-            columns=[
-                "fecha_salida_ma_min",
-                "_merge",
-            ],
-            inplace=True,
+    workers > 1 assigns the No.Economico units in parallel processes. progress
+    is called after every unit, see iter_unit_assignments.
+    backend defaults to COMPARISON_BACKEND. The polars backend gives the same
+    result from one lazy query over all units, workers is not used.
+    """
+    backend = backend or COMPARISON_BACKEND
+    if backend not in COMPARISON_BACKENDS:
+        raise ValueError(
+            f"Unknown comparison backend {backend}, use one of {COMPARISON_BACKENDS}"
         )
+    viajes_unidad_df, pase_df = prepare_comparison_data(viajes_unidad_df, pase_df)
 
-        # reorder columns
-        columns_sorting = [
-            "Viaje",
-            "Tag",
-            "No.Economico",
-            "Fecha",
-            "Hora",
-            "Caseta",
-            "Carril",
-            "Clase",
-            "Importe",
-            "Fecha Aplicacion",
-            "Hora Aplicacion",
-            "Consecar",
-            "Fecha y Hora de Salida",
-            "gmt_datetime",
-            "pase_datetime",
-            "Ruta",
-            "pase_vs_gmt",
-        ]
-        pase_con_num_viaje = pase_con_num_viaje[columns_sorting]
-
-        # verify items amount
-        logging.info(
-            f"Addition of GMT values to PASE is completed for no economico: {num_econimico}"
-        )
-        if len(pase_con_num_viaje) == len(target_pase_df):
-            logging.info(
-                f"GMT items comparison with PASE is correct: {len(target_pase_df)}"
-            )
-        else:
-            logging.error(
-                f"GMT items comparison with PASE is incorrect: {len(pase_con_num_viaje)} vs {len(target_pase_df)}"
-            )
+    if backend == "polars":
+        # polars_comparison imports this module
+        from polars_comparison import polars_comparison
 
-        # * Append to records_df
-        if records_df.empty:
-            records_df = pase_con_num_viaje
-        else:
-            records_df = pd.concat([records_df, pase_con_num_viaje])
-        logging.info(
-            f"current records df : rows {records_df.shape[0]} columns {records_df.shape[1]}"
+        records_df = polars_comparison(viajes_unidad_df, pase_df, progress=progress)
+    else:
+        records_df = pandas_comparison(
+            viajes_unidad_df, pase_df, workers=workers, progress=progress
         )
 
-    # clean records_df columns
-    records_df = records_df.drop(columns=["pase_vs_gmt", "gmt_datetime"])
-
     # * save results
     logging.info(
         f"Final Records df : rows {records_df.shape[0]} columns {records_df.shape[1]}"
@@ -546,4 +801,47 @@ def comparison(viajes_unidad_df: pd.DataFrame, pase_df: pd.DataFrame) -> pd.Data
 
 
 if __name__ == "__main__":
-    comparison()
+    # logging full config
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    # batch_comparison loads and cleans the files before calling comparison()
+    from batch_comparison import compare_files
+
+    parser = argparse.ArgumentParser(
+        description="Compare one GM Transport and PASE file pair"
+    )
+    parser.add_argument("gmt_file")
+    parser.add_argument("pase_file")
+    parser.add_argument("output", help="Comparison result as CSV")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--backend", choices=COMPARISON_BACKENDS, default=COMPARISON_BACKEND
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Write a flamegraph .folded file and a memory report next to the output",
+    )
+    parser.add_argument(
+        "--no-trace-memory",
+        action="store_true",
+        help="Profile without tracemalloc, which slows the run",
+    )
+    args = parser.parse_args()
+
+    if args.profile:
+        from profiling import profile_run, write_profile
+
+        # worker processes are not sampled, the profiled run compares in one process
+        with profile_run(trace_memory=not args.no_trace_memory) as run_profile:
+            result_df = compare_files(
+                args.gmt_file, args.pase_file, backend=args.backend
+            )
+        write_profile(run_profile, os.path.splitext(args.output)[0])
+    else:
+        result_df = compare_files(
+            args.gmt_file, args.pase_file, workers=args.workers, backend=args.backend
+        )
+    result_df.to_csv(args.output, index=False, encoding="utf-8", sep=",")
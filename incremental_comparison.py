@@ -0,0 +1,208 @@
+import logging
+import os
+import tempfile
+import threading
+
+import pandas as pd
+
+from data_cleaning.pase import add_dataset_information
+from gmt_pase_comparison import (
+    RESULT_COLUMNS,
+    compare_unit,
+    iter_unit_partitions,
+    prepare_comparison_data,
+)
+
+# previous results and watermarks of the incremental comparison, one store by dataset
+INCREMENTAL_STORE_DIR = os.path.join("db", "incremental")
+INCREMENTAL_STORE_PATH = os.path.join(INCREMENTAL_STORE_DIR, "default.pkl")
+
+# one lock by store, jobs of the same dataset run one after the other
+store_locks = {}
+store_locks_lock = threading.Lock()
+
+
+def incremental_store_path(dataset: str) -> str:
+    """
+    Store of a dataset, e.g. the handle of an uploaded GM Transport file.
+    """
+    return os.path.join(INCREMENTAL_STORE_DIR, f"{dataset}.pkl")
+
+
+def store_lock(store_path: str) -> threading.Lock:
+    # Lock of a store, created on first use
+    with store_locks_lock:
+        return store_locks.setdefault(os.path.abspath(store_path), threading.Lock())
+
+
+def date_watermarks(df: pd.DataFrame, name: str) -> pd.Series:
+    """
+    Content signature of the rows of every (No.Economico, Fecha).
+    """
+    hashes = pd.util.hash_pandas_object(df, index=False)
+    watermarks = hashes.groupby([df["No.Economico"], df["Fecha"]]).sum()
+    return watermarks.astype("UInt64").rename(name)
+
+
+def load_incremental_store(store_path: str) -> dict:
+    """
+    Load previous results, an empty store is returned on the first run.
+    """
+    if not os.path.exists(store_path):
+        logging.info(f"No previous comparison found in {store_path}")
+        return {"watermarks": None, "records": {}}
+    return pd.read_pickle(store_path)
+
+
+def save_incremental_store(store: dict, store_path: str):
+    """
+    Save results and watermarks for the next incremental run.
+
+    The store is written to a temporary file and then replaces the previous one,
+    a failed or concurrent read never sees a partial store.
+    """
+    directory = os.path.dirname(store_path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        pd.to_pickle(store, temp_path)
+        os.replace(temp_path, store_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    logging.info(f"Incremental comparison saved to {store_path}")
+
+
+def first_changed_dates(
+    watermarks: pd.DataFrame, previous_watermarks: pd.DataFrame
+) -> pd.Series:
+    """
+    Earliest Fecha with new, removed or modified rows for every No.Economico.
+    """
+    columns = ["gmt_hash", "pase_hash"]
+    if previous_watermarks is None:
+        previous_watermarks = pd.DataFrame(columns=columns, dtype="UInt64")
+        previous_watermarks.index = watermarks.index[:0]
+
+    current, previous = watermarks[columns].align(
+        previous_watermarks[columns], join="outer"
+    )
+    changed = (current.fillna(0) != previous.fillna(0)).any(axis=1)
+    changed_keys = changed[changed].index.to_frame(index=False)
+    return changed_keys.groupby("No.Economico")["Fecha"].min()
+
+
+def compare_unit_incremental(
+    num_econimico,
+    target_viajes_unidad_df: pd.DataFrame,
+    target_pase_df: pd.DataFrame,
+    previous_df: pd.DataFrame,
+    primer_cambio,
+) -> pd.DataFrame:
+    """
+    Compare one No.Economico reusing its previous result before primer_cambio,
+    the first changed Fecha (NaT when nothing changed).
+    """
+    # * reuse previous results when nothing changed
+    if previous_df is not None and pd.isna(primer_cambio):
+        logging.info(f"No changes for No.Economico {num_econimico}")
+        return previous_df
+
+    # boundary day: last crossing date before the first changed date
+    fechas_previas = target_pase_df.loc[
+        target_pase_df["Fecha"] < primer_cambio, "Fecha"
+    ]
+    fecha_limite = fechas_previas.max()
+    prefix_df = None
+    if previous_df is not None and not pd.isna(fecha_limite):
+        prefix_df = previous_df[previous_df["Fecha"] < fecha_limite]
+
+    if prefix_df is None or prefix_df.empty:
+        # * compare the whole No.Economico
+        logging.info(f"Full comparison for No.Economico {num_econimico}")
+        return compare_unit(num_econimico, target_viajes_unidad_df, target_pase_df)
+
+    # * compare again from the boundary day, carrying the last Fecha y Hora de Salida
+    logging.info(
+        f"Incremental comparison for No.Economico {num_econimico} from {fecha_limite}"
+    )
+    recalculado_df = compare_unit(
+        num_econimico,
+        target_viajes_unidad_df,
+        target_pase_df[target_pase_df["Fecha"] >= fecha_limite],
+        fecha_salida_inicial=prefix_df["Fecha y Hora de Salida"].iloc[-1],
+    )
+    return pd.concat([prefix_df, recalculado_df], ignore_index=True)
+
+
+def incremental_comparison(
+    viajes_unidad_df: pd.DataFrame,
+    pase_df: pd.DataFrame,
+    store_path: str = INCREMENTAL_STORE_PATH,
+    progress=None,
+) -> pd.DataFrame:
+    """
+    Compare GM Transport and PASE dataframes reusing the results of the last run.
+
+    Watermarks per No.Economico and Fecha detect new or changed data. A unit is only
+    compared again from its first changed Fecha, starting one crossing date earlier
+    so crossings of trips that span midnight are reassigned as well. Later dates
+    are always compared again because assignments carry forward in time.
+    progress is called after every unit, as in comparison. Runs on the same
+    store_path wait for each other, so every run starts from the last saved store.
+    """
+    viajes_unidad_df, pase_df = prepare_comparison_data(viajes_unidad_df, pase_df)
+    with store_lock(store_path):
+        records = incremental_records(viajes_unidad_df, pase_df, store_path, progress)
+
+    if len(records) > 0:
+        records_df = pd.concat(records.values())
+    else:
+        records_df = pd.DataFrame(columns=RESULT_COLUMNS)
+    logging.info(
+        f"Final Records df : rows {records_df.shape[0]} columns {records_df.shape[1]}"
+    )
+    return records_df
+
+
+def incremental_records(
+    viajes_unidad_df: pd.DataFrame, pase_df: pd.DataFrame, store_path: str, progress
+) -> dict:
+    """
+    Result of every No.Economico from the store in store_path, saved back to it.
+    """
+    store = load_incremental_store(store_path)
+    previous_records = store["records"]
+
+    # * detect new and changed dates by No.Economico
+    watermarks = pd.concat(
+        [
+            date_watermarks(viajes_unidad_df, "gmt_hash"),
+            date_watermarks(pase_df, "pase_hash"),
+        ],
+        axis=1,
+    )
+    cambios = first_changed_dates(watermarks, store["watermarks"])
+    logging.info(f"No.Economico with new or changed dates : {len(cambios)}")
+
+    records = {}
+    particiones = list(iter_unit_partitions(viajes_unidad_df, pase_df))
+    for num_econimico, target_viajes_unidad_df, target_pase_df in particiones:
+        records[num_econimico] = compare_unit_incremental(
+            num_econimico,
+            target_viajes_unidad_df,
+            target_pase_df,
+            previous_records.get(num_econimico),
+            cambios.get(num_econimico, pd.NaT),
+        )
+        if progress is not None:
+            progress(len(records), len(particiones), num_econimico)
+
+    # * save results and watermarks for the next run
+    previous_id = 0
+    if store["watermarks"] is not None:
+        previous_id = int(store["watermarks"]["db_id"].max())
+    watermarks = add_dataset_information(watermarks, previous_id)
+    save_incremental_store({"watermarks": watermarks, "records": records}, store_path)
+    return records
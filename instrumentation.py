@@ -0,0 +1,192 @@
+import contextvars
+import functools
+import json
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# stage records of the current run, None while instrumentation is disabled
+current_recorder = contextvars.ContextVar("current_recorder", default=None)
+
+
+def peak_memory_mb():
+    """
+    Peak resident memory of the process in MB, None when it can not be measured.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is reported in KB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2)
+
+
+def new_recorder() -> dict:
+    # Empty stage records, enabled with enable_instrumentation or recording
+    return {"events": [], "units": []}
+
+
+def enable_instrumentation() -> dict:
+    """
+    Start recording stages in the current thread, discarding previous records.
+    """
+    recorder = new_recorder()
+    current_recorder.set(recorder)
+    return recorder
+
+
+def disable_instrumentation():
+    """
+    Stop recording stages in the current thread.
+    """
+    current_recorder.set(None)
+
+
+def instrumentation_enabled() -> bool:
+    return current_recorder.get() is not None
+
+
+@contextmanager
+def recording(recorder: dict):
+    """
+    Record the stages of the with block in recorder, e.g. the recorder of a
+    background job, and restore the previous recorder afterwards. A None
+    recorder records nothing.
+    """
+    token = current_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        current_recorder.reset(token)
+
+
+def instrumentation_events() -> list:
+    """
+    Stage records of the current run, one dict per executed stage.
+    """
+    recorder = current_recorder.get()
+    if recorder is None:
+        return []
+    return recorder["events"]
+
+
+def add_instrumentation_events(events: list):
+    """
+    Append stage records collected somewhere else, e.g. in a worker process.
+    """
+    recorder = current_recorder.get()
+    if recorder is not None:
+        recorder["events"].extend(events)
+
+
+def rows_of(value):
+    # Row count of dataframes, None for anything else
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+    return None
+
+
+@contextmanager
+def stage(name: str, unit=None, rows_in: int = None):
+    """
+    Record wall time, rows and peak memory of the code inside the with block.
+
+    The yielded dict accepts a rows_out value. Nested stages inherit the unit of
+    the enclosing stage. When instrumentation is disabled nothing is recorded.
+    """
+    recorder = current_recorder.get()
+    if recorder is None:
+        yield {}
+        return
+
+    if unit is None and len(recorder["units"]) > 0:
+        unit = recorder["units"][-1]
+    record = {"stage": name, "unit": unit, "rows_in": rows_in, "rows_out": None}
+    recorder["units"].append(unit)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = round(time.perf_counter() - start, 6)
+        record["peak_memory_mb"] = peak_memory_mb()
+        recorder["units"].pop()
+        recorder["events"].append(record)
+
+
+def timed_stage(name: str):
+    """
+    Decorator recording a function as a stage, rows are taken from the first
+    argument and from the returned dataframe.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if current_recorder.get() is None:
+                return func(*args, **kwargs)
+            rows_in = rows_of(args[0]) if len(args) > 0 else None
+            with stage(name, rows_in=rows_in) as record:
+                result = func(*args, **kwargs)
+                record["rows_out"] = rows_of(result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def instrumentation_summary(events: list = None) -> dict:
+    """
+    Aggregate stage records by stage and by unit.
+    """
+    if events is None:
+        events = instrumentation_events()
+    events_df = pd.DataFrame(
+        events,
+        columns=["stage", "unit", "rows_in", "rows_out", "seconds", "peak_memory_mb"],
+    )
+    events_df = events_df.astype(
+        {"unit": "Int64", "rows_in": "Int64", "rows_out": "Int64", "seconds": float}
+    )
+
+    stages_df = events_df.groupby("stage", sort=False).agg(
+        calls=("seconds", "size"),
+        seconds=("seconds", "sum"),
+        rows_in=("rows_in", "sum"),
+        rows_out=("rows_out", "sum"),
+        peak_memory_mb=("peak_memory_mb", "max"),
+    )
+    units_df = (
+        events_df[events_df["stage"] == "compare_unit"]
+        .groupby("unit", sort=False)
+        .agg(seconds=("seconds", "sum"), rows=("rows_out", "sum"))
+        .sort_values(by="seconds", ascending=False)
+    )
+    # to_json writes numpy numbers and missing values as plain JSON
+    return {
+        "stages": json.loads(stages_df.reset_index().to_json(orient="records")),
+        "units": json.loads(units_df.reset_index().to_json(orient="records")),
+    }
+
+
+def export_instrumentation_json(path: str = None, recorder: dict = None) -> str:
+    """
+    Export the summary and all stage records as JSON, written to path when given.
+
+    recorder defaults to the recorder of the current run.
+    """
+    if recorder is None:
+        events = instrumentation_events()
+    else:
+        events = recorder["events"]
+    report = instrumentation_summary(events)
+    report["events"] = events
+    report_json = json.dumps(report, indent=2, default=str)
+    if path is not None:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(report_json)
+    return report_json
@@ -0,0 +1,507 @@
+"""
+Polars backend of comparison().
+
+The trip assignment and the business rules of gmt_pase_comparison run as one
+Polars lazy query over all the No.Economico units at once: as-of joins replace
+the searchsorted sweeps, and caseta shifts and the Fecha y Hora de Salida fill
+run over the window of every unit. Viaje keeps the GM Transport values and is
+returned in the viaje_dtype of gmt_pase_comparison, as in the pandas backend.
+
+polars_file_comparison also cleans the files in Polars: the PASE CSV is scanned
+lazily with the date window and the needed columns pushed into the scan, and
+the GM Transport cleaning runs as lazy expressions. polars_comparison starts
+from the cleaned pandas dataframes of the app instead; only the keys needed to
+assign trips go through Polars and the other result columns are taken from the
+pandas inputs by row position. Both give the same columns, dtypes and row order
+as the pandas backend, benchmarks/verify_backends.py checks the results are
+identical.
+"""
+
+# build-in libs
+import logging
+import time
+
+# installed libs
+import numpy as np
+import pandas as pd
+import polars as pl
+
+# custom libs
+from gmt_pase_comparison import (
+    CASETA_RULES,
+    FECHA_INICIO_COMPARACION,
+    RESULT_COLUMNS,
+    comparison,
+    timedelta_to_time,
+    velox_labels,
+    viaje_dtype,
+)
+from data_cleaning.parsing import parse_unique_datetimes
+from data_cleaning.pase import FECHA_FORMATS, HORA_FORMATS
+from data_cleaning.schema import expand_dtypes
+from instrumentation import stage
+
+# PASE columns read as text, they are parsed or stripped by the lazy cleaning
+PASE_TEXT_COLUMNS = [
+    "Tag",
+    "Fecha",
+    "Hora",
+    "Caseta",
+    "Carril",
+    "Importe",
+    "Fecha Aplicacion",
+    "Hora Aplicacion",
+]
+
+
+def polars_keys(
+    viajes_unidad_df: pd.DataFrame, pase_df: pd.DataFrame, rules: list
+) -> tuple[pl.LazyFrame, pl.LazyFrame]:
+    """
+    GM Transport and PASE key columns as lazy frames, rows identified by position.
+
+    Every PASE row gets the unit order of comparison(), units without GM Transport
+    rows are left out as in the pandas backend. Caseta rules are given as one
+    boolean column per rule.
+    """
+    unidades = pd.unique(viajes_unidad_df["No.Economico"].to_numpy())
+    orden = pl.DataFrame({"unidad": unidades, "orden": np.arange(len(unidades))})
+
+    gmt = pl.DataFrame(
+        {
+            "gmt_row": np.arange(len(viajes_unidad_df)),
+            "unidad": viajes_unidad_df["No.Economico"].to_numpy(),
+            "Fecha": viajes_unidad_df["Fecha"].to_numpy(),
+            "hora_salida": viajes_unidad_df["Hora Salida"].to_numpy(),
+            "Viaje": viajes_unidad_df["Viaje"].to_numpy(),
+            "salida": viajes_unidad_df["Fecha y Hora de Salida"].to_numpy(),
+            "ruta": pd.factorize(viajes_unidad_df["Ruta"])[0],
+        }
+    )
+    pase = pl.DataFrame(
+        {
+            "row": np.arange(len(pase_df)),
+            "unidad": pase_df["No.Economico"].to_numpy(),
+            "Fecha": pase_df["Fecha"].to_numpy(),
+            "Hora": pase_df["Hora"].to_numpy(),
+            "pase_datetime": pase_df["pase_datetime"].to_numpy(),
+            **{
+                f"caseta_{i}": (pase_df["Caseta"] == rule["caseta"]).to_numpy()
+                for i, rule in enumerate(rules)
+            },
+        }
+    )
+    pase = pase.join(orden.cast({"unidad": pase["unidad"].dtype}), on="unidad")
+    return gmt.lazy(), pase.lazy()
+
+
+def strip_text(column: str) -> pl.Expr:
+    # Text column without surrounding spaces
+    return pl.col(column).str.strip_chars()
+
+
+def parse_mixed(values: pl.Series, dayfirst: bool) -> pl.Series:
+    # Values no strict format matched, parsed as clean_pase_data does with format mixed
+    parsed = parse_unique_datetimes(values.to_pandas(), [], dayfirst=dayfirst)
+    return pl.from_pandas(parsed).cast(pl.Datetime("us"))
+
+
+def parse_datetimes(column: str, formats: list, dayfirst: bool = False) -> pl.Expr:
+    """
+    Datetimes of a text column as parse_unique_datetimes: every format is tried
+    strictly and only the values matching none of them are parsed with format
+    mixed, which raises on values it can not parse.
+    """
+    estricto = pl.coalesce(
+        pl.col(column).str.to_datetime(formato, time_unit="us", strict=False)
+        for formato in formats
+    )
+    pendientes = pl.when(estricto.is_null()).then(pl.col(column))
+    return pl.coalesce(
+        estricto,
+        pendientes.map_batches(
+            lambda values: parse_mixed(values, dayfirst),
+            return_dtype=pl.Datetime("us"),
+            is_elementwise=True,
+        ),
+    ).alias(column)
+
+
+def parse_fechas(column: str) -> pl.Expr:
+    # Datetime of a date in FECHA_FORMATS, day first for other formats
+    return parse_datetimes(column, FECHA_FORMATS, dayfirst=True)
+
+
+def parse_horas(column: str) -> pl.Expr:
+    # Time of day in HORA_FORMATS, e.g. 12-hour times parsed with format mixed
+    return parse_datetimes(column, HORA_FORMATS).dt.time()
+
+
+def clean_gmt_query(
+    viajes_df: pd.DataFrame, fecha_inicio: pd.Timestamp = FECHA_INICIO_COMPARACION
+) -> pl.LazyFrame:
+    """
+    clean_gmt_data and the comparison window of prepare_comparison_data as a
+    lazy query over a raw GM Transport export, as load_gmt_data returns it.
+
+    Only the columns the comparison needs are kept: the key columns of
+    assign_trips_query, Ruta, and the unit order of comparison() as orden.
+    """
+    salida = "Fecha y Hora de Salida"
+    gmt = (
+        pl.from_pandas(viajes_df.rename(columns=str.strip))
+        .lazy()
+        .rename({"Viaje Docto.": "Viaje", "Tractocamión": "Unidad"}, strict=False)
+        .filter(pl.col(salida).is_not_null())
+    )
+    if gmt.collect_schema()[salida] == pl.String:
+        fecha_salida = pl.col(salida).str.to_datetime(
+            "%d/%m/%Y %H:%M:%S", time_unit="us"
+        )
+    else:
+        fecha_salida = pl.col(salida).cast(pl.Datetime("us"))
+
+    # * Velox shipments: Viajes with a VELOX or 3502 row, those rows kept
+    es_velox = pl.col("Unidad").str.contains("VELOX").fill_null(False)
+    es_flota = es_velox | (pl.col("Unidad") == "3502").fill_null(False)
+    gmt = (
+        gmt.with_columns(fecha_salida)
+        .sort(salida, "Unidad", maintain_order=True)
+        .filter(es_flota.any().over("Viaje") & es_flota)
+        # VELOX units first and then 3502
+        .sort(~es_velox, maintain_order=True)
+        .select(
+            unidad=pl.col("Unidad").str.extract(r"(\d+)").cast(pl.Int64),
+            Fecha=pl.col(salida).dt.truncate("1d"),
+            hora_salida=pl.col(salida) - pl.col(salida).dt.truncate("1d"),
+            Viaje=pl.col("Viaje"),
+            salida=pl.col(salida),
+            ruta=pl.col("Ruta").cast(pl.String),
+        )
+        .with_row_index("gmt_row")
+        .filter(pl.col("Fecha") >= fecha_inicio)
+    )
+    # units in order of their first GM Transport row, as comparison()
+    return gmt.with_columns(orden=pl.col("gmt_row").min().over("unidad"))
+
+
+def scan_pase(
+    file, fecha_inicio=None, fecha_fin=None, rules: list = CASETA_RULES
+) -> pl.LazyFrame:
+    """
+    clean_pase_data as a lazy scan of a PASE CSV file, a path or the file bytes.
+
+    Rows outside [fecha_inicio, fecha_fin] are filtered inside the CSV scan, as
+    load_pase_data does for every chunk. row is the position in the file, it keeps
+    crossings at the same time in file order. Dates and times matching none of
+    FECHA_FORMATS and HORA_FORMATS are parsed with format mixed, as in
+    clean_pase_data.
+    """
+    pase = pl.scan_csv(
+        file,
+        schema_overrides={column: pl.String for column in PASE_TEXT_COLUMNS},
+        row_index_name="row",
+    )
+    # the window is one predicate on the raw Fecha column, so it runs in the scan
+    fecha = parse_fechas("Fecha")
+    ventana = []
+    if fecha_inicio is not None:
+        ventana.append(fecha >= fecha_inicio)
+    if fecha_fin is not None:
+        ventana.append(fecha <= fecha_fin)
+    if len(ventana) > 0:
+        pase = pase.filter(*ventana)
+
+    # * format columns as clean_pase_data
+    pase = pase.with_columns(
+        parse_fechas("Fecha"),
+        strip_text("Tag"),
+        strip_text("Caseta"),
+        strip_text("Carril"),
+        parse_horas("Hora"),
+        parse_fechas("Fecha Aplicacion"),
+        parse_horas("Hora Aplicacion"),
+        pl.col("No.Economico", "Clase", "Consecar").cast(pl.Int64),
+        pl.col("Importe").str.replace_all(r"[$,]", "").cast(pl.Float64),
+    )
+    return pase.with_columns(
+        unidad=pl.col("No.Economico"),
+        pase_datetime=pl.col("Fecha").dt.combine(pl.col("Hora"), "us"),
+        **{
+            f"caseta_{i}": pl.col("Caseta") == rule["caseta"]
+            for i, rule in enumerate(rules)
+        },
+    )
+
+
+def assign_trips_query(
+    gmt: pl.LazyFrame, pase: pl.LazyFrame, rules: list = CASETA_RULES
+) -> pl.LazyFrame:
+    """
+    Lazy query of the assigned Viaje, Fecha y Hora de Salida, and the GM Transport
+    row and ruta of the Ruta of every PASE row, in the row order of the pandas
+    backend.
+    """
+    # * trips of every unit and Fecha
+    por_fecha = gmt.group_by("unidad", "Fecha").agg(
+        total=pl.col("Viaje").count(),
+        viaje_unico=pl.col("Viaje").min(),
+        salida_unica=pl.col("salida").max(),
+    )
+    pase = pase.join(por_fecha, on=["unidad", "Fecha"], how="left")
+
+    # * dates with more than one Viaje: last departure of the date before the crossing
+    salidas = (
+        gmt.join(
+            por_fecha.filter(pl.col("total") > 1).select("unidad", "Fecha"),
+            on=["unidad", "Fecha"],
+        )
+        .group_by("unidad", "Fecha", "Viaje", "salida")
+        .agg(clave=(pl.col("Fecha") + pl.col("hora_salida")).min())
+        # departures at the same time keep the highest Viaje, as the pandas sweep
+        .sort("unidad", "Fecha", "clave", "Viaje", "salida")
+        .unique(subset=["unidad", "Fecha", "clave"], keep="last", maintain_order=True)
+        .sort("clave")
+    )
+    por_hora = (
+        pase.filter((pl.col("total") > 1) & pl.col("pase_datetime").is_not_null())
+        .select("row", "unidad", "Fecha", "pase_datetime")
+        .sort("pase_datetime")
+        .join_asof(
+            salidas,
+            left_on="pase_datetime",
+            right_on="clave",
+            by=["unidad", "Fecha"],
+            strategy="backward",
+            check_sortedness=False,
+        )
+        .select("row", viaje_hora="Viaje", salida_hora="salida")
+    )
+    pase = pase.join(por_hora, on="row", how="left").with_columns(
+        Viaje=pl.when(pl.col("total") == 1)
+        .then(pl.col("viaje_unico"))
+        .when(pl.col("total") > 1)
+        .then(pl.col("viaje_hora")),
+        salida=pl.when(pl.col("total") == 1)
+        .then(pl.col("salida_unica"))
+        .when(pl.col("total") > 1)
+        .then(pl.col("salida_hora")),
+    )
+
+    # * crossings before the departure of their Viaje lose it
+    antes = (pl.col("pase_datetime") < pl.col("salida")).fill_null(False)
+    pase = pase.with_columns(
+        Viaje=pl.when(antes).then(None).otherwise(pl.col("Viaje")),
+        salida=pl.when(antes).then(None).otherwise(pl.col("salida")),
+    )
+
+    # * crossings without Viaje: last Viaje started before the crossing
+    inicios = (
+        gmt.group_by("unidad", "Viaje")
+        .agg(inicio=pl.col("salida").min())
+        # starts at the same time keep the highest Viaje, as the pandas sweep
+        .sort("unidad", "inicio", "Viaje")
+        .unique(subset=["unidad", "inicio"], keep="last", maintain_order=True)
+        .sort("inicio")
+    )
+    por_inicio = (
+        pase.filter(pl.col("Viaje").is_null() & pl.col("pase_datetime").is_not_null())
+        .select("row", "unidad", "pase_datetime")
+        .sort("pase_datetime")
+        .join_asof(
+            inicios,
+            left_on="pase_datetime",
+            right_on="inicio",
+            by="unidad",
+            strategy="backward",
+            check_sortedness=False,
+        )
+        .select("row", viaje_inicio="Viaje")
+    )
+    pase = (
+        pase.join(por_inicio, on="row", how="left")
+        .with_columns(Viaje=pl.coalesce("Viaje", "viaje_inicio"))
+        .rename({"salida": "Fecha y Hora de Salida"})
+        # units in GM Transport order, crossings by Fecha and Hora, crossings at
+        # the same time in PASE order
+        .sort("orden", "Fecha", "Hora", "row", nulls_last=True)
+    )
+
+    # * caseta rules, shifted inside every unit
+    for i, rule in enumerate(rules):
+        pase = pase.with_columns(
+            pl.when(pl.col(f"caseta_{i}"))
+            .then(pl.col(column).shift(rule["shift"]).over("unidad"))
+            .otherwise(pl.col(column))
+            for column in rule["columns"]
+        )
+
+    # * Fecha y Hora de Salida filled from the previous crossing of the unit
+    pase = pase.with_columns(
+        pl.col("Fecha y Hora de Salida").forward_fill().over("unidad")
+    )
+
+    # * Ruta of the assigned Viaje and departure
+    rutas = gmt.unique(
+        subset=["unidad", "Viaje", "ruta", "salida"], keep="first", maintain_order=True
+    ).select(
+        "unidad", "Viaje", "gmt_row", "ruta", **{"Fecha y Hora de Salida": "salida"}
+    )
+    return pase.join(
+        rutas,
+        on=["unidad", "Fecha y Hora de Salida", "Viaje"],
+        how="left",
+        maintain_order="left_right",
+    ).select("row", "Viaje", "Fecha y Hora de Salida", "gmt_row", "ruta")
+
+
+def pandas_viajes(values: pl.Series, dtype):
+    """
+    Assigned Polars Viajes as the pandas array of the Viaje result column, dtype
+    is the viaje_dtype of the GM Transport Viajes.
+    """
+    if dtype == pd.Int64Dtype():
+        return pd.arrays.IntegerArray(
+            values.fill_null(0).cast(pl.Int64).to_numpy(), values.is_null().to_numpy()
+        )
+    return pd.Series(values.to_numpy(), dtype=object).astype(dtype).array
+
+
+def polars_comparison(
+    viajes_unidad_df: pd.DataFrame,
+    pase_df: pd.DataFrame,
+    progress=None,
+    rules: list = CASETA_RULES,
+) -> pd.DataFrame:
+    """
+    Compare the dataframes returned by prepare_comparison_data with Polars.
+
+    Polars runs the query on all cores, so there is no workers argument. progress
+    is called before and after the query, the units are compared together.
+    """
+    unidades = pd.Index(viajes_unidad_df["No.Economico"].unique())
+    total = len(unidades.intersection(pase_df["No.Economico"].unique()))
+    if progress is not None:
+        progress(0, total, None)
+    if total == 0:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    with stage("polars_query", rows_in=len(pase_df)) as record:
+        gmt, pase = polars_keys(viajes_unidad_df, pase_df, rules)
+        resultado = assign_trips_query(gmt, pase, rules).collect()
+        record["rows_out"] = len(resultado)
+    logging.info(f"Polars query : {len(resultado)} rows of {total} No.Economico")
+
+    # * result columns taken from the pandas inputs by row position
+    records_df = pase_df.iloc[resultado["row"].to_numpy()].reset_index(drop=True)
+    records_df["Viaje"] = pandas_viajes(
+        resultado["Viaje"], viaje_dtype(viajes_unidad_df["Viaje"])
+    )
+    records_df["Fecha y Hora de Salida"] = resultado[
+        "Fecha y Hora de Salida"
+    ].to_numpy()
+    records_df["Ruta"] = viajes_unidad_df["Ruta"].array.take(
+        resultado["gmt_row"].fill_null(-1).to_numpy(), allow_fill=True
+    )
+    records_df["No.Economico"] = velox_labels(records_df["No.Economico"])
+    records_df = expand_dtypes(records_df[RESULT_COLUMNS])
+    records_df["Hora"] = timedelta_to_time(records_df["Hora"])
+    records_df["Hora Aplicacion"] = timedelta_to_time(records_df["Hora Aplicacion"])
+
+    if progress is not None:
+        progress(total, total, None)
+    return records_df
+
+
+def polars_file_comparison(
+    viajes_df: pd.DataFrame, pase_file, progress=None, rules: list = CASETA_RULES
+) -> pd.DataFrame:
+    """
+    Clean and compare a raw GM Transport export and a PASE CSV file with Polars.
+
+    The result is the one of comparison() on clean_gmt_data(viajes_df) and the
+    PASE file read by load_pase_data from FECHA_INICIO_COMPARACION to the last
+    GM Transport date. The GM Transport rows are collected first, their last Fecha
+    bounds the PASE scan; the PASE cleaning, the trip assignment and the rules
+    then run as one lazy query. progress is called before and after it.
+    """
+    if progress is not None:
+        progress(0, None, None)
+    with stage("polars_clean_gmt", rows_in=len(viajes_df)) as record:
+        gmt = clean_gmt_query(viajes_df).collect()
+        record["rows_out"] = len(gmt)
+    if len(gmt) == 0:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    pase = scan_pase(pase_file, FECHA_INICIO_COMPARACION, gmt["Fecha"].max(), rules)
+    # units without GM Transport rows are left out, as in comparison()
+    orden = gmt.group_by("unidad").agg(pl.col("orden").first())
+    pase = pase.join(orden.lazy(), on="unidad")
+    with stage("polars_query") as record:
+        resultado = (
+            assign_trips_query(gmt.lazy(), pase, rules)
+            .drop("gmt_row")
+            .rename({"ruta": "Ruta"})
+            .join(
+                pase.select(
+                    "row",
+                    *[
+                        column
+                        for column in RESULT_COLUMNS
+                        if column not in ["Viaje", "Fecha y Hora de Salida", "Ruta"]
+                    ],
+                ),
+                on="row",
+                how="left",
+                maintain_order="left",
+            )
+            .select(RESULT_COLUMNS)
+            .collect()
+        )
+        record["rows_out"] = len(resultado)
+    total = resultado["No.Economico"].n_unique()
+    logging.info(f"Polars query : {len(resultado)} rows of {total} No.Economico")
+
+    # * pandas dtypes of the comparison result
+    records_df = resultado.drop("Viaje").to_pandas()
+    viajes = viajes_df.rename(columns=str.strip)["Viaje Docto."]
+    records_df.insert(
+        0, "Viaje", pandas_viajes(resultado["Viaje"], viaje_dtype(viajes))
+    )
+    records_df["No.Economico"] = velox_labels(records_df["No.Economico"])
+    for column in ["Tag", "Caseta", "Carril", "Ruta"]:
+        records_df[column] = records_df[column].astype("str")
+
+    if progress is not None:
+        progress(total, total, None)
+    return records_df
+
+
+def compare_backends(
+    viajes_unidad_df: pd.DataFrame, pase_df, compare=comparison
+) -> dict:
+    """
+    Run compare with the pandas and the Polars backend on the same data and
+    report whether the results are identical.
+
+    compare defaults to comparison() on cleaned data, batch_comparison's
+    compare_raw_data checks the cleaning as well.
+    """
+    resultados, segundos = {}, {}
+    for backend in ["pandas", "polars"]:
+        start = time.perf_counter()
+        resultados[backend] = compare(viajes_unidad_df, pase_df, backend=backend)
+        segundos[backend] = round(time.perf_counter() - start, 3)
+
+    difference = None
+    try:
+        pd.testing.assert_frame_equal(resultados["pandas"], resultados["polars"])
+    except AssertionError as e:
+        difference = str(e)
+    return {
+        "rows": len(resultados["pandas"]),
+        "pandas_seconds": segundos["pandas"],
+        "polars_seconds": segundos["polars"],
+        "identical": difference is None,
+        "difference": difference,
+    }
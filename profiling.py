@@ -0,0 +1,149 @@
+"""
+Opt-in profiler of a load, clean and compare run.
+
+The calling thread is sampled every PROFILE_INTERVAL_SECONDS and its stacks are
+counted in the folded format read by flamegraph.pl, inferno and speedscope:
+
+    main (velox-app.py:512);comparison (gmt_pase_comparison.py:671) 42
+
+Memory is tracked with tracemalloc, the report lists the peak traced memory and
+the source lines holding the most memory at the end of the run.
+"""
+
+# build-in libs
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# seconds between two samples of the profiled thread
+PROFILE_INTERVAL_SECONDS = 0.005
+
+# source lines listed in the memory report
+MEMORY_TOP_LINES = 25
+
+
+def frame_label(frame) -> str:
+    # Function name with the file and line where it is defined
+    code = frame.f_code
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+def folded_stack(frame) -> str:
+    """
+    Stack of frame as one folded line, outermost frame first.
+    """
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def sample_thread(profile: dict, thread_id: int, stop: threading.Event):
+    # Count the stack of thread_id until stop is set
+    while not stop.wait(profile["interval"]):
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            profile["stacks"][folded_stack(frame)] += 1
+        # release the frames of the profiled thread
+        del frame
+
+
+@contextmanager
+def profile_run(interval: float = PROFILE_INTERVAL_SECONDS, trace_memory=True):
+    """
+    Sample the stacks of the current thread and trace memory inside the with block.
+
+    The yielded profile dict is filled when the block exits. Work done in worker
+    processes is not sampled, profile runs with workers=1. tracemalloc traces the
+    whole process, so other threads allocating at the same time are included.
+    """
+    profile = {
+        "interval": interval,
+        "stacks": collections.Counter(),
+        "seconds": None,
+        "memory_peak_mb": None,
+        "memory_top": [],
+    }
+    started_tracing = False
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        started_tracing = True
+
+    stop = threading.Event()
+    sampler = threading.Thread(
+        target=sample_thread,
+        args=(profile, threading.get_ident(), stop),
+        name="profiler",
+        daemon=True,
+    )
+    start = time.perf_counter()
+    sampler.start()
+    try:
+        yield profile
+    finally:
+        stop.set()
+        sampler.join()
+        profile["seconds"] = round(time.perf_counter() - start, 3)
+        if trace_memory and tracemalloc.is_tracing():
+            profile["memory_peak_mb"] = round(
+                tracemalloc.get_traced_memory()[1] / 1024**2, 2
+            )
+            statistics = tracemalloc.take_snapshot().statistics("lineno")
+            profile["memory_top"] = [
+                (str(stat.traceback), round(stat.size / 1024**2, 2), stat.count)
+                for stat in statistics[:MEMORY_TOP_LINES]
+            ]
+        if started_tracing:
+            tracemalloc.stop()
+        logging.info(
+            f"Profile finished : {profile['seconds']} seconds {sum(profile['stacks'].values())} samples peak traced memory {profile['memory_peak_mb']} MB"
+        )
+
+
+def folded_stacks(profile: dict) -> str:
+    """
+    Sampled stacks as folded lines, one line per stack with its sample count.
+    """
+    return "".join(
+        f"{stack} {count}\n" for stack, count in profile["stacks"].most_common()
+    )
+
+
+def memory_report(profile: dict) -> str:
+    """
+    Wall time, peak traced memory and the source lines holding the most memory.
+    """
+    lines = [
+        f"seconds: {profile['seconds']}",
+        f"samples: {sum(profile['stacks'].values())} every {profile['interval']} seconds",
+        f"peak traced memory MB: {profile['memory_peak_mb']}",
+        "",
+        "memory held at the end of the run by source line (MB, blocks):",
+    ]
+    lines += [
+        f"{size:>10} {count:>10}  {line}" for line, size, count in profile["memory_top"]
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def write_profile(profile: dict, path_prefix: str) -> list:
+    """
+    Write path_prefix.folded and path_prefix.memory.txt, returns both paths.
+    """
+    directory = os.path.dirname(path_prefix)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    paths = [f"{path_prefix}.folded", f"{path_prefix}.memory.txt"]
+    for path, content in zip(paths, [folded_stacks(profile), memory_report(profile)]):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+    logging.info(f"Profile written to {paths[0]} and {paths[1]}")
+    return paths
@@ -0,0 +1,277 @@
+"""
+Local SQLite store of reconciled crossings.
+
+Comparison results are upserted by Consecar, so saving an overlapping run again
+updates its crossings instead of duplicating them. Indexes on (No.Economico,
+pase_datetime), Viaje and Caseta answer audit questions, e.g. the crossings
+charged to a Viaje, without reloading old exports.
+
+    python reconciled_store.py --viaje 100227
+    python reconciled_store.py --no-economico 2402 --caseta LINCOLN --desde 2025-01-01
+"""
+
+# build-in libs
+import argparse
+import logging
+import os
+import sqlite3
+
+# installed libs
+import numpy as np
+import pandas as pd
+
+# custom libs
+from data_cleaning.parsing import parse_unique_datetimes
+from gmt_pase_comparison import RESULT_COLUMNS, velox_labels
+
+RECONCILED_DB_PATH = os.path.join("db", "reconciled.sqlite")
+
+# SQLite column and declared type of every result column
+STORE_COLUMNS = {
+    "Consecar": ("consecar", "INTEGER PRIMARY KEY"),
+    "Viaje": ("viaje", "INTEGER"),
+    "Tag": ("tag", "TEXT"),
+    "No.Economico": ("no_economico", "TEXT"),
+    "Fecha": ("fecha", "TEXT"),
+    "Hora": ("hora", "TEXT"),
+    "Caseta": ("caseta", "TEXT"),
+    "Carril": ("carril", "TEXT"),
+    "Clase": ("clase", "INTEGER"),
+    "Importe": ("importe", "REAL"),
+    "Fecha Aplicacion": ("fecha_aplicacion", "TEXT"),
+    "Hora Aplicacion": ("hora_aplicacion", "TEXT"),
+    "Fecha y Hora de Salida": ("fecha_hora_salida", "TEXT"),
+    "pase_datetime": ("pase_datetime", "TEXT"),
+    "Ruta": ("ruta", "TEXT"),
+}
+
+# datetimes are stored as ISO text, so text order is time order
+DATETIME_COLUMNS = [
+    "Fecha",
+    "Fecha Aplicacion",
+    "Fecha y Hora de Salida",
+    "pase_datetime",
+]
+TIME_COLUMNS = ["Hora", "Hora Aplicacion"]
+TIME_FORMATS = ["%H:%M:%S", "%H:%M:%S.%f"]
+SQL_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+STORE_INDEXES = {
+    "crossings_unidad_fecha": ["no_economico", "pase_datetime"],
+    "crossings_viaje": ["viaje"],
+    "crossings_caseta": ["caseta"],
+}
+
+# rows written per executemany call
+UPSERT_CHUNK_ROWS = 50_000
+
+
+def connect_store(db_path: str = RECONCILED_DB_PATH) -> sqlite3.Connection:
+    """
+    Open the reconciled store, creating its table and indexes when missing.
+    """
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    # readers of other sessions are not blocked while a run is saved
+    conn.execute("PRAGMA journal_mode=WAL")
+    columnas = ", ".join(f"{nombre} {tipo}" for nombre, tipo in STORE_COLUMNS.values())
+    conn.execute(f"CREATE TABLE IF NOT EXISTS crossings ({columnas}, updated_at TEXT)")
+    for index, columns in STORE_INDEXES.items():
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {index} ON crossings ({', '.join(columns)})"
+        )
+    return conn
+
+
+def python_value(value):
+    # sqlite3 only binds Python scalars, object columns can hold numpy scalars
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def store_values(records_df: pd.DataFrame) -> dict:
+    """
+    Result columns as arrays of SQLite values by STORE_COLUMNS name, None for empty.
+    """
+    valores = {}
+    for column, (nombre, _) in STORE_COLUMNS.items():
+        serie = records_df[column]
+        if column in DATETIME_COLUMNS:
+            serie = pd.to_datetime(serie).dt.strftime(SQL_DATETIME_FORMAT)
+        elif column in TIME_COLUMNS:
+            serie = serie.map(str, na_action="ignore")
+        elif serie.dtype == object:
+            serie = serie.map(python_value, na_action="ignore")
+        valores[nombre] = serie.to_numpy(dtype=object, na_value=None)
+    return valores
+
+
+def upsert_reconciled(
+    records_df: pd.DataFrame, db_path: str = RECONCILED_DB_PATH
+) -> int:
+    """
+    Insert or update comparison rows by Consecar, returns the rows written.
+
+    A crossing merged with more than one Ruta keeps its last row.
+    """
+    repetidos = records_df["Consecar"].duplicated(keep="last")
+    if repetidos.any():
+        logging.warning(
+            f"Reconciled crossings with a repeated Consecar : {repetidos.sum()} rows, the last row is stored"
+        )
+        records_df = records_df[~repetidos]
+    valores = store_values(records_df)
+    nombres = list(valores)
+    actualizar = ", ".join(
+        f"{nombre} = excluded.{nombre}" for nombre in nombres + ["updated_at"]
+    )
+    sql = (
+        f"INSERT INTO crossings ({', '.join(nombres)}, updated_at) "
+        f"VALUES ({', '.join('?' * len(nombres))}, datetime('now')) "
+        f"ON CONFLICT(consecar) DO UPDATE SET {actualizar}"
+    )
+
+    conn = connect_store(db_path)
+    try:
+        with conn:
+            for start in range(0, len(records_df), UPSERT_CHUNK_ROWS):
+                filas = zip(
+                    *(v[start : start + UPSERT_CHUNK_ROWS] for v in valores.values())
+                )
+                conn.executemany(sql, filas)
+    finally:
+        conn.close()
+    logging.info(f"Reconciled crossings upserted : {len(records_df)} rows in {db_path}")
+    return len(records_df)
+
+
+def unit_label(num_economico) -> str:
+    # Stored No.Economico label of a unit number, e.g. 2402 is "VELOX 2402"
+    if str(num_economico).strip().isdigit():
+        return velox_labels(pd.Series([int(num_economico)])).iloc[0]
+    return str(num_economico).strip()
+
+
+def from_store(rows_df: pd.DataFrame) -> pd.DataFrame:
+    # SQLite rows back to the result columns and types
+    records_df = rows_df.rename(
+        columns={nombre: column for column, (nombre, _) in STORE_COLUMNS.items()}
+    )
+    for column in DATETIME_COLUMNS:
+        records_df[column] = pd.to_datetime(
+            records_df[column], format=SQL_DATETIME_FORMAT
+        ).astype("datetime64[us]")
+    # integer Viajes are read as float when some crossings have no Viaje
+    if pd.api.types.is_float_dtype(records_df["Viaje"]):
+        records_df["Viaje"] = records_df["Viaje"].astype("Int64")
+    for column in TIME_COLUMNS:
+        records_df[column] = parse_unique_datetimes(
+            records_df[column], TIME_FORMATS
+        ).dt.time
+    return records_df[RESULT_COLUMNS]
+
+
+def query_crossings(
+    viaje=None,
+    num_economico=None,
+    caseta: str = None,
+    fecha_inicio=None,
+    fecha_fin=None,
+    limit: int = None,
+    db_path: str = RECONCILED_DB_PATH,
+) -> pd.DataFrame:
+    """
+    Reconciled crossings matching every given filter, ordered by unit and time.
+
+    num_economico accepts the unit number or its label. fecha_inicio and
+    fecha_fin bound pase_datetime, a date fecha_fin includes the whole day.
+    """
+    condiciones, parametros = [], []
+    if viaje is not None:
+        condiciones.append("viaje = ?")
+        parametros.append(python_value(viaje))
+    if num_economico is not None:
+        condiciones.append("no_economico = ?")
+        parametros.append(unit_label(num_economico))
+    if caseta is not None:
+        condiciones.append("caseta = ?")
+        parametros.append(caseta)
+    if fecha_inicio is not None:
+        condiciones.append("pase_datetime >= ?")
+        parametros.append(f"{pd.Timestamp(fecha_inicio):{SQL_DATETIME_FORMAT}}")
+    if fecha_fin is not None:
+        fecha_fin = pd.Timestamp(fecha_fin)
+        if fecha_fin == fecha_fin.normalize():
+            fecha_fin += pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+        condiciones.append("pase_datetime <= ?")
+        parametros.append(f"{fecha_fin:{SQL_DATETIME_FORMAT}}")
+
+    sql = f"SELECT {', '.join(nombre for nombre, _ in STORE_COLUMNS.values())} FROM crossings"
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    sql += " ORDER BY no_economico, pase_datetime"
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+
+    conn = connect_store(db_path)
+    try:
+        rows_df = pd.read_sql_query(sql, conn, params=parametros)
+    finally:
+        conn.close()
+    return from_store(rows_df)
+
+
+def reconciled_summary(db_path: str = RECONCILED_DB_PATH) -> dict:
+    """
+    Rows, units, casetas and crossing dates of the reconciled store.
+    """
+    conn = connect_store(db_path)
+    try:
+        rows, units, first, last = conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT no_economico), MIN(pase_datetime), "
+            "MAX(pase_datetime) FROM crossings"
+        ).fetchone()
+        casetas = [
+            caseta
+            for (caseta,) in conn.execute(
+                "SELECT DISTINCT caseta FROM crossings WHERE caseta IS NOT NULL "
+                "ORDER BY caseta"
+            )
+        ]
+    finally:
+        conn.close()
+    return {
+        "rows": rows,
+        "units": units,
+        "casetas": casetas,
+        "first": None if first is None else pd.Timestamp(first),
+        "last": None if last is None else pd.Timestamp(last),
+    }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    parser = argparse.ArgumentParser(description="Query reconciled crossings")
+    parser.add_argument("--viaje", default=None)
+    parser.add_argument("--no-economico", default=None)
+    parser.add_argument("--caseta", default=None)
+    parser.add_argument("--desde", default=None, help="First crossing date")
+    parser.add_argument("--hasta", default=None, help="Last crossing date")
+    parser.add_argument("--db", default=RECONCILED_DB_PATH)
+    args = parser.parse_args()
+
+    records_df = query_crossings(
+        viaje=args.viaje,
+        num_economico=args.no_economico,
+        caseta=args.caseta,
+        fecha_inicio=args.desde,
+        fecha_fin=args.hasta,
+        db_path=args.db,
+    )
+    print(records_df.to_string(index=False))
@@ -0,0 +1,217 @@
+"""
+Dataframes of the app sessions, shared by every session of the server process.
+
+Sessions keep only frame handles in st.session_state. A handle is the key of a
+frame, derived from the content hash of the files it comes from, so sessions
+loading the same files share one frame. Frames beyond FRAME_MEMORY_BUDGET_MB
+are spilled to a directory of the server process in FRAME_STORE_DIR, least
+recently used first, and read back when used again. Spilled frames beyond
+FRAME_DISK_BUDGET_MB are removed, a session then loads its files again. The
+directory is removed when the process exits, other server processes sharing
+FRAME_STORE_DIR keep their spilled files.
+"""
+
+# build-in libs
+import atexit
+import collections
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+# installed libs
+import pandas as pd
+
+# custom libs
+from data_cleaning.schema import memory_usage_mb
+
+FRAME_STORE_DIR = os.path.join("db", "frames")
+
+# memory of the frames kept loaded and disk of the spilled frames
+FRAME_MEMORY_BUDGET_MB = 2_048
+FRAME_DISK_BUDGET_MB = 20_480
+
+# least recently used frame first
+frames = collections.OrderedDict()
+frames_lock = threading.RLock()
+
+# spill directory of this process, created on the first spill
+spill_dir = None
+
+
+def process_spill_dir(store_dir: str = FRAME_STORE_DIR) -> str:
+    """
+    Spill directory of this process in store_dir, removed when the process exits.
+    """
+    global spill_dir
+    with frames_lock:
+        if spill_dir is None:
+            os.makedirs(store_dir, exist_ok=True)
+            spill_dir = tempfile.mkdtemp(prefix=f"{os.getpid()}-", dir=store_dir)
+            atexit.register(shutil.rmtree, spill_dir, ignore_errors=True)
+            logging.info(f"Frames of this process are spilled to {spill_dir}")
+        return spill_dir
+
+
+def frame_key(df: pd.DataFrame) -> str:
+    """
+    Content hash of a dataframe: values, index, column names and dtypes.
+    """
+    digest = hashlib.sha256(pd.util.hash_pandas_object(df).to_numpy().tobytes())
+    digest.update(repr(list(zip(df.columns, df.dtypes.astype(str)))).encode())
+    return f"frame-{digest.hexdigest()}"
+
+
+def spill_path(key: str, store_dir: str = None) -> str:
+    # Handles can hold any character, file names are their hash
+    if store_dir is None:
+        store_dir = process_spill_dir()
+    return os.path.join(store_dir, hashlib.sha256(key.encode()).hexdigest())
+
+
+def spill_frame(entry: dict):
+    """
+    Write a frame to disk once and release it from memory.
+
+    Parquet changes the dtype of object columns, e.g. Hora with time objects, so
+    frames with object columns are pickled instead.
+    """
+    if entry["path"] is None:
+        df = entry["df"]
+        path = spill_path(entry["key"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if (df.dtypes == object).any():
+            path += ".pkl"
+            df.to_pickle(path)
+        else:
+            path += ".parquet"
+            df.to_parquet(path)
+        entry["path"] = path
+        entry["disk_mb"] = os.path.getsize(path) / 1024**2
+    entry["df"] = None
+    logging.info(f"Frame {entry['key']} spilled to {entry['path']}")
+
+
+def read_spilled_frame(path: str) -> pd.DataFrame:
+    if path.endswith(".pkl"):
+        return pd.read_pickle(path)
+    return pd.read_parquet(path)
+
+
+def remove_spilled_frame(entry: dict):
+    # Remove the file of a frame, frames only on disk are removed from the store
+    try:
+        os.remove(entry["path"])
+    except FileNotFoundError:
+        pass
+    entry["path"] = None
+    entry["disk_mb"] = 0
+    if entry["df"] is None:
+        del frames[entry["key"]]
+        logging.info(f"Frame {entry['key']} evicted")
+
+
+def enforce_budgets():
+    """
+    Spill least recently used frames over the memory budget and remove least
+    recently used files over the disk budget.
+    """
+    with frames_lock:
+        memoria = sum(e["memory_mb"] for e in frames.values() if e["df"] is not None)
+        for entry in list(frames.values()):
+            if memoria <= FRAME_MEMORY_BUDGET_MB:
+                break
+            if entry["df"] is not None:
+                spill_frame(entry)
+                memoria -= entry["memory_mb"]
+
+        disco = sum(e["disk_mb"] for e in frames.values())
+        for entry in list(frames.values()):
+            if disco <= FRAME_DISK_BUDGET_MB:
+                break
+            if entry["path"] is not None:
+                disco -= entry["disk_mb"]
+                remove_spilled_frame(entry)
+
+
+def put_frame(df: pd.DataFrame, key: str = None, info: dict = None) -> str:
+    """
+    Keep a frame in the store and return its handle.
+
+    key defaults to the content hash of df. A frame already stored under key is
+    kept and df is dropped. info is a small dict returned by frame_info.
+    """
+    if key is None:
+        key = frame_key(df)
+    with frames_lock:
+        if key in frames:
+            frames.move_to_end(key)
+            return key
+        frames[key] = {
+            "key": key,
+            "df": df,
+            "path": None,
+            "memory_mb": float(memory_usage_mb(df)),
+            "disk_mb": 0,
+            "info": info or {},
+        }
+        enforce_budgets()
+    return key
+
+
+def get_frame(handle: str) -> pd.DataFrame:
+    """
+    Frame of a handle, read back from disk when spilled. None once evicted.
+
+    The returned frame stays usable after it is spilled again, the store only
+    releases its own reference.
+    """
+    with frames_lock:
+        entry = frames.get(handle)
+        if entry is None:
+            return None
+        frames.move_to_end(handle)
+        df = entry["df"]
+        if df is None:
+            df = read_spilled_frame(entry["path"])
+            entry["df"] = df
+            enforce_budgets()
+    return df
+
+
+def frame_info(handle: str) -> dict:
+    """
+    info dict given to put_frame, None once evicted.
+    """
+    entry = frames.get(handle)
+    if entry is None:
+        return None
+    return entry["info"]
+
+
+def cached_frame(key: str, build, *args, **kwargs) -> pd.DataFrame:
+    """
+    Frame stored under key, build(*args, **kwargs) is stored when it is missing.
+    """
+    df = get_frame(key)
+    if df is None:
+        df = build(*args, **kwargs)
+        put_frame(df, key)
+    return df
+
+
+def frame_store_summary() -> dict:
+    """
+    Frames in memory and on disk with their MB.
+    """
+    with frames_lock:
+        cargados = [e for e in frames.values() if e["df"] is not None]
+        return {
+            "frames": len(frames),
+            "in_memory": len(cargados),
+            "memory_mb": round(sum(e["memory_mb"] for e in cargados), 2),
+            "on_disk": sum(e["path"] is not None for e in frames.values()),
+            "disk_mb": round(sum(e["disk_mb"] for e in frames.values()), 2),
+        }
@@ -1,44 +1,241 @@
+import glob
+import hashlib
 import io
 import os
+import tempfile
+import time
 from datetime import datetime
 
-import pandas as pd
 import streamlit as st
 
-from data_cleaning.gmt_viajes_salida import clean_gmt_data
-from data_cleaning.pase import clean_pase_data
-from gmt_pase_comparison import comparison
+from data_cleaning.gmt_viajes_salida import (
+    GMT_CACHE_DIR,
+    clean_gmt_data,
+    concat_gmt_data,
+    load_gmt_data,
+    read_file_bytes,
+)
+from data_cleaning.crossing_index import load_crossing_index
+from data_cleaning.pase import load_pase_data
+from data_cleaning.schema import memory_usage_mb
+from comparison_jobs import (
+    cancel_job,
+    forget_job,
+    job_recorder,
+    job_result,
+    job_status,
+    submit_job,
+)
+from dataset_store import (
+    combine_cleaned_data,
+    comparison_window_signature,
+    ingest_pase_files,
+    load_comparison_window,
+    store_cleaned_data,
+    window_records,
+)
+from export_writers import EXPORT_FORMATS, export_result
+from gmt_pase_comparison import (
+    COMPARISON_BACKEND,
+    FECHA_INICIO_COMPARACION,
+    available_backends,
+    comparison,
+)
+from incremental_comparison import incremental_comparison, incremental_store_path
+from instrumentation import (
+    disable_instrumentation,
+    enable_instrumentation,
+    export_instrumentation_json,
+    recording,
+    stage,
+)
+from profiling import folded_stacks, memory_report, profile_run
+from reconciled_store import query_crossings, reconciled_summary, upsert_reconciled
+from session_store import (
+    cached_frame,
+    frame_info,
+    frame_store_summary,
+    get_frame,
+    put_frame,
+)
 
 # Flag to control local execution mode
 LOCAL_EXECUTION = False  # Set to False for production deployment
 
+# Seconds between two checks of a running comparison job
+JOB_POLL_SECONDS = 1
+
+# Files read in local mode
+GMT_LOCAL_PATTERN = os.path.join("test", "src", "gmt_transport_*.xlsx")
+PASE_LOCAL_PATTERN = os.path.join("test", "src", "pase_data_*.csv")
+
+# Reconciled crossings shown by a query of the reconciled crossings view
+QUERY_MAX_ROWS = 5_000
+
+
+def file_contents(files, local_pattern):
+    """Return the bytes of the uploaded files, or of local_pattern files in local mode"""
+    if LOCAL_EXECUTION and not files:
+        # Load from local test directory when in local mode
+        files = sorted(glob.glob(local_pattern))
+    if not files:
+        raise ValueError("No file uploaded")
+    return [read_file_bytes(file) for file in files]
+
+
+def combined_hash(content_hashes):
+    """Hash of several files, a single file keeps its own hash"""
+    if len(content_hashes) == 1:
+        return content_hashes[0]
+    return hashlib.sha256("".join(sorted(content_hashes)).encode()).hexdigest()
+
+
+def session_frame(handle_key):
+    """Frame of a session handle, raises when it was evicted from the frame store"""
+    df = get_frame(st.session_state[handle_key])
+    if df is None:
+        raise ValueError(
+            "The loaded data is no longer available, please load the files again"
+        )
+    return df
+
+
+def job_result_frame(job_id):
+    """Result frame of a finished job"""
+    result_df = get_frame(job_result(job_id))
+    if result_df is None:
+        raise ValueError("The comparison result is no longer available")
+    return result_df
+
+
+def load_gmt_contents(contents, cache_dir=GMT_CACHE_DIR):
+    """Parse and concatenate GM Transport workbooks"""
+    return concat_gmt_data(
+        [
+            load_gmt_data(io.BytesIO(content), cache_dir=cache_dir)
+            for content in contents
+        ]
+    )
+
+
+def load_pase_contents(contents, fecha_inicio=None, fecha_fin=None):
+    """Load and clean PASE files, crossings repeated between the files are skipped
+    before cleaning"""
+    crossing_index = load_crossing_index()
+    dfs = [
+        load_pase_data(
+            io.BytesIO(content), fecha_inicio, fecha_fin, crossing_index=crossing_index
+        )
+        for content in contents
+    ]
+    return combine_cleaned_data(dfs, "pase"), crossing_index["duplicated_rows"]
+
+
+def run_comparison(
+    gmt_handle,
+    pase_handle,
+    workers,
+    incremental,
+    store_window,
+    backend=COMPARISON_BACKEND,
+    progress=None,
+):
+    """Comparison executed as a background job, returns the handle of the result"""
+    gmt_df, pase_df = get_frame(gmt_handle), get_frame(pase_handle)
+    if gmt_df is None or pase_df is None:
+        raise ValueError(
+            "The loaded data is no longer available, please load the files again"
+        )
+
+    result_handle = None
+    if incremental:
+        # one store by GM Transport upload, concurrent jobs of other uploads
+        # do not share it
+        result_df = incremental_comparison(
+            gmt_df,
+            pase_df,
+            store_path=incremental_store_path(gmt_handle),
+            progress=progress,
+        )
+    else:
+        # compared once per pair of GM Transport and PASE contents, both backends
+        # give the same result
+        result_handle = f"result-{gmt_handle}-{pase_handle}"
+        result_df = cached_frame(
+            result_handle,
+            comparison,
+            gmt_df,
+            pase_df,
+            workers=workers,
+            progress=progress,
+            backend=backend,
+        )
+
+    # Keep only the crossings of the dataset store window
+    if store_window is not None:
+        result_df = window_records(result_df, *store_window)
+        result_handle = None
+    if result_handle is None:
+        result_handle = put_frame(result_df)
+    return result_handle
+
+
+def run_profiled_comparison(
+    gmt_contents,
+    pase_contents,
+    store_window,
+    trace_memory,
+    profile,
+    backend=COMPARISON_BACKEND,
+    progress=None,
+):
+    """Load, clean and compare without caches inside the profiler, executed as a
+    background job. The profile dict is filled with the report, returns the handle
+    of the result"""
+    with profile_run(trace_memory=trace_memory) as report:
+        if store_window is not None:
+            gmt_df, pase_df = load_comparison_window(*store_window)
+        else:
+            gmt_df = clean_gmt_data(load_gmt_contents(gmt_contents, cache_dir=None))
+            pase_df, _ = load_pase_contents(
+                pase_contents, FECHA_INICIO_COMPARACION, gmt_df["Fecha Salida"].max()
+            )
+        result_df = comparison(gmt_df, pase_df, progress=progress, backend=backend)
+        if store_window is not None:
+            result_df = window_records(result_df, *store_window)
+    profile.update(report)
+    return put_frame(result_df)
 
-def load_gmt_file(file):
-    """Load and validate GM Transport Excel file"""
+
+def load_gmt_files(files):
+    """Load and validate one or more GM Transport Excel files"""
     try:
-        if LOCAL_EXECUTION and file is None:
-            # Load from local test directory when in local mode
-            local_path = os.path.join("test", "src", "gmt_transport_1.xlsx")
-            df = pd.read_excel(local_path, engine="openpyxl")
-        else:
-            df = pd.read_excel(file, engine="openpyxl")
-        return df, None
+        contents = file_contents(files, GMT_LOCAL_PATTERN)
+        content_hashes = [hashlib.sha256(content).hexdigest() for content in contents]
+        # parsed once per contents
+        gmt_handle = f"gmt-{combined_hash(content_hashes)}"
+        df = cached_frame(gmt_handle, load_gmt_contents, contents)
+        return df, gmt_handle, None
     except Exception as e:
-        return None, f"Error loading GM Transport file: {str(e)}"
+        return None, None, f"Error loading GM Transport file: {str(e)}"
 
 
-def load_pase_file(file):
-    """Load and validate PASE CSV file"""
+def load_pase_files(files, fecha_inicio=None, fecha_fin=None):
+    """Load, validate and clean PASE CSV files streaming only the target dates"""
     try:
-        if LOCAL_EXECUTION and file is None:
-            # Load from local test directory when in local mode
-            local_path = os.path.join("test", "src", "pase_data_1.csv")
-            df = pd.read_csv(local_path, sep=",", encoding="utf-8")
+        contents = file_contents(files, PASE_LOCAL_PATTERN)
+        content_hashes = [hashlib.sha256(content).hexdigest() for content in contents]
+        # loaded once per contents and date window
+        pase_handle = f"pase-{combined_hash(content_hashes)}-{fecha_inicio}-{fecha_fin}"
+        df = get_frame(pase_handle)
+        if df is None:
+            df, duplicated_rows = load_pase_contents(contents, fecha_inicio, fecha_fin)
+            put_frame(df, pase_handle, info={"duplicated_rows": duplicated_rows})
         else:
-            df = pd.read_csv(file, sep=",", encoding="utf-8")
-        return df, None
+            duplicated_rows = frame_info(pase_handle)["duplicated_rows"]
+        return df, pase_handle, duplicated_rows, None
     except Exception as e:
-        return None, f"Error loading PASE file: {str(e)}"
+        return None, None, 0, f"Error loading PASE file: {str(e)}"
 
 
 def display_dataframe_info(df, title):
@@ -47,153 +244,436 @@ def display_dataframe_info(df, title):
     st.write(f"  • Number of rows: {len(df)}")
     st.write(f"  • Number of columns: {len(df.columns)}")
     st.write(f"  • Columns: {', '.join(df.columns)}")
+    st.write(f"  • Memory usage: {memory_usage_mb(df):.2f} MB")
 
 
-def main():
-    st.title("Data Comparison Tool")
+def export_job_result(job_id, export_format):
+    """Export the result of a finished job once per export format"""
+    export_key = (job_id, export_format)
+    if (
+        st.session_state.export is not None
+        and st.session_state.export["key"] == export_key
+    ):
+        return st.session_state.export
+
+    result_df = job_result_frame(job_id)
+
+    # Generate timestamp for filename
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    # Create the export file, written in chunks to a temporary file
+    file_extension, mime_type = EXPORT_FORMATS[export_format]
+    # recorded with the stages of the job, the page reruns while it is polled
+    with recording(job_recorder(job_id)), stage("export", rows_in=len(result_df)):
+        with tempfile.TemporaryFile() as f:
+            export_result(result_df, export_format, f)
+            f.seek(0)
+            # the only in-memory copy, kept by streamlit for the download
+            output = f.read()
+
+    if LOCAL_EXECUTION:
+        # Save to local test directory for testing
+        local_path = os.path.join("test", f"gmt_pase_{timestamp}.csv")
+        export_result(result_df, "CSV", local_path)
+        st.info(f"Saved output to {local_path}")
+
+    st.session_state.export = {
+        "key": export_key,
+        "data": output,
+        "file_name": f"gmt_pase_{timestamp}.{file_extension}",
+        "mime": mime_type,
+        "timestamp": timestamp,
+    }
+    return st.session_state.export
+
+
+def show_comparison_job(job_id, export_format):
+    """Poll a comparison job, showing its progress or its downloads"""
+    job = job_status(job_id)
+    if job is None:
+        st.warning("The comparison is no longer available, please process again")
+        return
+
+    if job["status"] in ("queued", "running"):
+        if job["status"] == "queued":
+            st.info("Waiting for other comparisons to finish...")
+        else:
+            total = job["total"] or 0
+            st.progress(
+                job["done"] / total if total else 0.0,
+                text=f"Compared {job['done']} of {total} No.Economico",
+            )
+        if st.button("Cancel"):
+            cancel_job(job_id)
+        time.sleep(JOB_POLL_SECONDS)
+        st.rerun()
+    elif job["status"] == "cancelled":
+        st.warning("Processing cancelled")
+    elif job["status"] == "error":
+        st.error(f"Error during processing: {job['error']}")
+    else:
+        try:
+            export = export_job_result(job_id, export_format)
+
+            # Create download button
+            st.download_button(
+                label="Download Results",
+                data=export["data"],
+                file_name=export["file_name"],
+                mime=export["mime"],
+            )
+
+            # Download the profile of a profiled run
+            if st.session_state.profile:
+                st.download_button(
+                    label="Download Profile (flamegraph)",
+                    data=folded_stacks(st.session_state.profile),
+                    file_name=f"gmt_pase_profile_{export['timestamp']}.folded",
+                    mime="text/plain",
+                )
+                st.download_button(
+                    label="Download Memory Profile",
+                    data=memory_report(st.session_state.profile),
+                    file_name=f"gmt_pase_profile_{export['timestamp']}.memory.txt",
+                    mime="text/plain",
+                )
+
+            # Download the stage timings of a job submitted with instrumentation
+            recorder = job_recorder(job_id)
+            if recorder is not None:
+                st.download_button(
+                    label="Download Stage Timings",
+                    data=export_instrumentation_json(recorder=recorder),
+                    file_name=f"gmt_pase_timings_{export['timestamp']}.json",
+                    mime="application/json",
+                )
+
+            # Keep the reconciled crossings for audit queries
+            if st.button("Save to reconciled crossings"):
+                saved = upsert_reconciled(job_result_frame(job_id))
+                st.success(f"{saved} reconciled crossings saved")
+
+            st.success("Processing completed successfully!")
+
+        except Exception as e:
+            st.error(f"Error during processing: {str(e)}")
+
 
-    # Initialize session state
-    if "gmt_transport_df" not in st.session_state:
-        st.session_state.gmt_transport_df = None
-    if "pase_df" not in st.session_state:
-        st.session_state.pase_df = None
-    if "cleaned_gmt_df" not in st.session_state:
-        st.session_state.cleaned_gmt_df = None
-    if "cleaned_pase_df" not in st.session_state:
-        st.session_state.cleaned_pase_df = None
+def load_uploaded_files():
+    """Load and clean the uploaded GM Transport and PASE files"""
+    st.session_state.store_window = None
 
     # File uploaders in columns
     col1, col2 = st.columns(2)
 
     with col1:
-        st.subheader("GM Transport File (Excel)")
+        st.subheader("GM Transport Files (Excel)")
         if not LOCAL_EXECUTION:
-            gmt_file = st.file_uploader("Upload GM Transport file", key="gm_upload")
+            gmt_files = st.file_uploader(
+                "Upload GM Transport files",
+                accept_multiple_files=True,
+                key="gm_upload",
+            )
         else:
-            st.info("Running in local mode - Using test/src/gmt_transport.xlsx")
-            gmt_file = None
+            st.info(f"Running in local mode - Using {GMT_LOCAL_PATTERN}")
+            gmt_files = []
 
-        df, error = load_gmt_file(gmt_file)
+        df, gmt_handle, error = load_gmt_files(gmt_files)
 
         if error:
-            if gmt_file is None:
+            if not gmt_files:
                 st.warning("Please upload file")
             else:
                 st.error(error)
         else:
-            st.session_state.gmt_transport_df = df
-            st.success("GM Transport file loaded successfully!")
+            st.session_state.gmt_transport_handle = gmt_handle
+            st.success("GM Transport files loaded successfully!")
             display_dataframe_info(df, "Original GM Transport Data")
 
-            # Clean GMT data
+            # Clean GMT data once per content hash
             try:
-                st.session_state.cleaned_gmt_df = clean_gmt_data(df)
+                cleaned_handle = f"{gmt_handle}-clean"
+                cleaned_df = cached_frame(cleaned_handle, clean_gmt_data, df)
+                st.session_state.cleaned_gmt_handle = cleaned_handle
                 st.success("GM Transport data cleaned successfully!")
-                display_dataframe_info(
-                    st.session_state.cleaned_gmt_df, "Cleaned GM Transport Data"
-                )
+                display_dataframe_info(cleaned_df, "Cleaned GM Transport Data")
             except Exception as e:
                 st.error(f"Error cleaning GM Transport data: {str(e)}")
 
     with col2:
-        st.subheader("PASE File (CSV)")
+        st.subheader("PASE Files (CSV)")
         if not LOCAL_EXECUTION:
-            pase_file = st.file_uploader(
-                "Upload PASE file", type=["csv"], key="pase_upload"
+            pase_files = st.file_uploader(
+                "Upload PASE files",
+                type=["csv"],
+                accept_multiple_files=True,
+                key="pase_upload",
             )
         else:
-            st.info("Running in local mode - Using test/src/pase_data.csv")
-            pase_file = None
-
-        df, error = load_pase_file(pase_file)
+            st.info(f"Running in local mode - Using {PASE_LOCAL_PATTERN}")
+            pase_files = []
+
+        # Only read PASE dates that can be compared with GM Transport
+        fecha_fin = None
+        cleaned_gmt_df = get_frame(st.session_state.cleaned_gmt_handle)
+        if cleaned_gmt_df is not None and "Fecha Salida" in cleaned_gmt_df.columns:
+            fecha_fin = cleaned_gmt_df["Fecha Salida"].max()
+
+        df, pase_handle, duplicated_rows, error = load_pase_files(
+            pase_files, FECHA_INICIO_COMPARACION, fecha_fin
+        )
         if error:
-            if pase_file is None:
+            if not pase_files:
                 st.warning("Please upload file")
             else:
                 st.error(error)
         else:
-            st.session_state.pase_df = df
-            st.success("PASE file loaded successfully!")
-            display_dataframe_info(df, "Original PASE Data")
-
-            # Clean PASE data
-            try:
-                st.session_state.cleaned_pase_df = clean_pase_data(df)
-                st.success("PASE data cleaned successfully!")
-                display_dataframe_info(
-                    st.session_state.cleaned_pase_df, "Cleaned PASE Data"
+            st.session_state.cleaned_pase_handle = pase_handle
+            st.success("PASE files loaded and cleaned successfully!")
+            if duplicated_rows > 0:
+                st.info(
+                    f"{duplicated_rows} PASE crossings repeated between the files were skipped"
                 )
-            except Exception as e:
-                st.error(f"Error cleaning PASE data: {str(e)}")
+            display_dataframe_info(df, "Cleaned PASE Data")
+
+    # Keep the cleaned rows in the dataset store, partitioned by month and No.Economico
+    if (
+        st.session_state.cleaned_gmt_handle is not None
+        and st.session_state.cleaned_pase_handle is not None
+        and st.button("Add cleaned data to the dataset store")
+    ):
+        try:
+            gmt_partitions = store_cleaned_data(
+                session_frame("cleaned_gmt_handle"), "gmt"
+            )
+            # PASE crossings already stored are skipped before cleaning
+            pase_contents = file_contents(pase_files, PASE_LOCAL_PATTERN)
+            report = ingest_pase_files(
+                [io.BytesIO(content) for content in pase_contents],
+                FECHA_INICIO_COMPARACION,
+                fecha_fin,
+            )
+            st.success(
+                f"Dataset store updated: {gmt_partitions} GM Transport partitions, {report['new_rows']} new PASE crossings, {report['duplicated_rows']} already stored"
+            )
+        except Exception as e:
+            st.error(f"Error storing cleaned data: {str(e)}")
+
+
+def load_dataset_store_window():
+    """Load the stored GM Transport and PASE rows of a reconciliation window"""
+    st.subheader("Dataset Store")
+    col1, col2 = st.columns(2)
+    fecha_inicio = col1.date_input("From:", FECHA_INICIO_COMPARACION)
+    fecha_fin = col2.date_input("To:", datetime.now())
+
+    try:
+        # loaded once per partitions signature and window
+        signature = comparison_window_signature(fecha_inicio, fecha_fin)
+        gmt_handle = f"store-gmt-{signature}-{fecha_inicio}-{fecha_fin}"
+        pase_handle = f"store-pase-{signature}-{fecha_inicio}-{fecha_fin}"
+        gmt_df, pase_df = get_frame(gmt_handle), get_frame(pase_handle)
+        if gmt_df is None or pase_df is None:
+            gmt_df, pase_df = load_comparison_window(fecha_inicio, fecha_fin)
+            put_frame(gmt_df, gmt_handle)
+            put_frame(pase_df, pase_handle)
+    except Exception as e:
+        st.session_state.cleaned_gmt_handle = None
+        st.session_state.cleaned_pase_handle = None
+        st.warning(f"Error loading the dataset store: {str(e)}")
+        return
+
+    st.session_state.gmt_transport_handle = None
+    st.session_state.cleaned_gmt_handle = gmt_handle
+    st.session_state.cleaned_pase_handle = pase_handle
+    st.session_state.store_window = (fecha_inicio, fecha_fin)
+    st.success("Stored data loaded successfully!")
+    display_dataframe_info(gmt_df, "Stored GM Transport Data")
+    display_dataframe_info(pase_df, "Stored PASE Data")
+
+
+def show_reconciled_crossings():
+    """Query the reconciled crossings saved by earlier comparisons"""
+    st.subheader("Reconciled Crossings")
+    try:
+        summary = reconciled_summary()
+    except Exception as e:
+        st.error(f"Error reading reconciled crossings: {str(e)}")
+        return
+    if summary["rows"] == 0:
+        st.info("No reconciled crossings saved yet, save the results of a comparison")
+        return
+    st.write(
+        f"{summary['rows']} crossings of {summary['units']} units from {summary['first']:%Y-%m-%d} to {summary['last']:%Y-%m-%d}"
+    )
+
+    col1, col2, col3 = st.columns(3)
+    viaje = col1.text_input("Viaje:").strip()
+    num_economico = col2.text_input("No.Economico:").strip()
+    caseta = col3.selectbox("Caseta:", ["All"] + summary["casetas"])
+    col1, col2 = st.columns(2)
+    fecha_inicio = col1.date_input("From:", summary["first"])
+    fecha_fin = col2.date_input("To:", summary["last"])
+
+    try:
+        start = time.perf_counter()
+        crossings_df = query_crossings(
+            viaje=viaje or None,
+            num_economico=num_economico or None,
+            caseta=None if caseta == "All" else caseta,
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_fin,
+            limit=QUERY_MAX_ROWS,
+        )
+        milliseconds = (time.perf_counter() - start) * 1000
+    except Exception as e:
+        st.error(f"Error querying reconciled crossings: {str(e)}")
+        return
+
+    st.write(f"{len(crossings_df)} crossings in {milliseconds:.0f} ms")
+    if len(crossings_df) == QUERY_MAX_ROWS:
+        st.warning(f"Only the first {QUERY_MAX_ROWS} crossings are shown")
+    st.dataframe(crossings_df, hide_index=True)
+
+
+def main():
+    st.title("Data Comparison Tool")
+
+    # Record wall time, rows and memory of every stage of this run
+    if st.sidebar.checkbox("Record stage timings"):
+        enable_instrumentation()
+    else:
+        disable_instrumentation()
+
+    # Sample load, clean and compare of the next run, caches are not used
+    profile_enabled = st.sidebar.checkbox("Profile this run")
+    trace_memory = profile_enabled and st.sidebar.checkbox(
+        "Track memory with tracemalloc (slower)", value=True
+    )
+
+    # Initialize session state, frames are kept in the shared frame store
+    if "gmt_transport_handle" not in st.session_state:
+        st.session_state.gmt_transport_handle = None
+    if "cleaned_gmt_handle" not in st.session_state:
+        st.session_state.cleaned_gmt_handle = None
+    if "cleaned_pase_handle" not in st.session_state:
+        st.session_state.cleaned_pase_handle = None
+    if "store_window" not in st.session_state:
+        st.session_state.store_window = None
+    if "job_id" not in st.session_state:
+        st.session_state.job_id = None
+    if "export" not in st.session_state:
+        st.session_state.export = None
+    if "profile" not in st.session_state:
+        st.session_state.profile = None
+
+    # Frames shared by the sessions of this server
+    frames = frame_store_summary()
+    st.sidebar.caption(
+        f"Shared frames: {frames['in_memory']} in memory ({frames['memory_mb']:.0f} MB), {frames['on_disk']} spilled ({frames['disk_mb']:.0f} MB)"
+    )
+
+    # Audit the reconciled crossings saved by earlier comparisons
+    view = st.sidebar.radio("View:", ("Comparison", "Reconciled crossings"))
+    if view == "Reconciled crossings":
+        show_reconciled_crossings()
+        return
+
+    # Compare uploaded files or a window of the dataset store
+    data_source = st.sidebar.radio("Data source:", ("Uploaded files", "Dataset store"))
+    if data_source == "Dataset store":
+        load_dataset_store_window()
+    else:
+        load_uploaded_files()
 
     # Process files if both are cleaned and ready
     if (
-        st.session_state.cleaned_gmt_df is not None
-        and st.session_state.cleaned_pase_df is not None
+        st.session_state.cleaned_gmt_handle is not None
+        and st.session_state.cleaned_pase_handle is not None
     ):
         st.subheader("Process Files")
 
         # Add export format selection
-        export_format = st.radio("Select export format:", ("Excel", "CSV"))
+        export_format = st.radio("Select export format:", tuple(EXPORT_FORMATS))
         if LOCAL_EXECUTION:
             export_format = "CSV"
 
-        download_status = st.button("Process and Download")
-        if LOCAL_EXECUTION:
-            download_status = True  # For testing purposes
-        if download_status:
-            try:
-                # Run comparison on cleaned data
-                result_df = comparison(
-                    st.session_state.cleaned_gmt_df, st.session_state.cleaned_pase_df
+        # Compare No.Economico units in parallel processes (1 = serial)
+        workers = st.number_input(
+            "Parallel workers:",
+            min_value=1,
+            max_value=os.cpu_count() or 1,
+            value=1,
+            step=1,
+        )
+
+        # Both backends give the same result, polars runs one query on all cores
+        backends = available_backends()
+        backend = st.selectbox(
+            "Comparison backend:",
+            backends,
+            index=backends.index(COMPARISON_BACKEND),
+            help="polars does not use parallel workers or incremental comparison",
+        )
+
+        # Reuse stored results and only compare new or changed dates
+        incremental = st.checkbox("Only compare new or changed dates")
+
+        process_clicked = st.button("Process and Download")
+        if LOCAL_EXECUTION and st.session_state.job_id is None:
+            process_clicked = True  # For testing purposes
+        if process_clicked:
+            # Run comparison on cleaned data as a background job
+            if st.session_state.job_id is not None:
+                forget_job(st.session_state.job_id)
+            st.session_state.export = None
+            st.session_state.profile = None
+            if profile_enabled:
+                # The profiled job reads the files again, in one process, or the
+                # dataset store window when there are no uploaded files
+                gmt_contents, pase_contents = None, None
+                if st.session_state.store_window is None:
+                    gmt_contents = file_contents(
+                        st.session_state.get("gm_upload"), GMT_LOCAL_PATTERN
+                    )
+                    pase_contents = file_contents(
+                        st.session_state.get("pase_upload"), PASE_LOCAL_PATTERN
+                    )
+                st.session_state.profile = {}
+                st.session_state.job_id = submit_job(
+                    run_profiled_comparison,
+                    gmt_contents,
+                    pase_contents,
+                    st.session_state.store_window,
+                    trace_memory,
+                    st.session_state.profile,
+                    backend,
                 )
-
-                # Generate timestamp for filename
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-
-                # Create the export file
-                if export_format == "Excel":
-                    output = io.BytesIO()
-                    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-                        result_df.to_excel(writer, index=False)
-                    output.seek(0)
-                    file_extension = "xlsx"
-                    mime_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                else:  # CSV
-                    output = io.StringIO()
-                    result_df.to_csv(output, index=False)
-                    output = io.BytesIO(output.getvalue().encode())
-                    file_extension = "csv"
-                    mime_type = "text/csv"
-
-                    if LOCAL_EXECUTION:
-                        # Save to local test directory for testing
-                        local_path = os.path.join("test", f"gmt_pase_{timestamp}.csv")
-                        result_df.to_csv(
-                            local_path, index=False, encoding="utf-8", sep=","
-                        )
-                        st.info(f"Saved output to {local_path}")
-
-                # Create download button
-                filename = f"gmt_pase_{timestamp}.{file_extension}"
-                st.download_button(
-                    label="Download Results",
-                    data=output,
-                    file_name=filename,
-                    mime=mime_type,
+            else:
+                st.session_state.job_id = submit_job(
+                    run_comparison,
+                    st.session_state.cleaned_gmt_handle,
+                    st.session_state.cleaned_pase_handle,
+                    int(workers),
+                    incremental,
+                    st.session_state.store_window,
+                    backend,
                 )
 
-                st.success("Processing completed successfully!")
-
-            except Exception as e:
-                st.error(f"Error during processing: {str(e)}")
+        if st.session_state.job_id is not None:
+            show_comparison_job(st.session_state.job_id, export_format)
 
     # Clear data button
     if st.button("Clear All Data"):
-        st.session_state.gmt_transport_df = None
-        st.session_state.pase_df = None
-        st.session_state.cleaned_gmt_df = None
-        st.session_state.cleaned_pase_df = None
+        st.session_state.gmt_transport_handle = None
+        st.session_state.cleaned_gmt_handle = None
+        st.session_state.cleaned_pase_handle = None
+        st.session_state.store_window = None
+        if st.session_state.job_id is not None:
+            forget_job(st.session_state.job_id)
+        st.session_state.job_id = None
+        st.session_state.export = None
+        st.session_state.profile = None
 
 
 if __name__ == "__main__":